@@ -24,6 +24,7 @@ class Buffer(MacroSpec):
         distance: int = 1
         unit: str = "miles"
         geometryColumnName: str = ""
+        geometryType: str = "auto"
         
 
     def get_relation_names(self, component: Component, context: SqlContext):
@@ -70,7 +71,16 @@ class Buffer(MacroSpec):
                     SchemaColumnsDropdown("Geometry column")
                         .bindSchema("component.ports.inputs[0].schema")
                         .bindProperty("geometryColumnName")
-                )                               
+                )
+                .addElement(
+                    SelectBox("Geometry Type")
+                        .addOption("Detect from Column Type", "auto")
+                        .addOption("WKT", "wkt")
+                        .addOption("WKB", "wkb")
+                        .addOption("Point Struct (lon, lat)", "struct")
+                        .addOption("H3 Cell (centre)", "h3")
+                        .bindProperty("geometryType")
+                )
                 .addElement(
                     NumberBox("Distance",placeholder="10").bindProperty("distance")
                 )                
@@ -81,7 +91,22 @@ class Buffer(MacroSpec):
 
     def validate(self, context: SqlContext, component: Component) -> List[Diagnostic]:
         # Validate the component's state
-        return super().validate(context,component)
+        diagnostics = super().validate(context, component)
+
+        column_name = component.properties.geometryColumnName
+        column_type = self.column_type(component.properties.schema, column_name)
+        if component.properties.geometryType in ["auto", "wkt"] and column_type.startswith(("double", "float", "integer", "short", "byte", "decimal")):
+            diagnostics.append(
+                Diagnostic("component.properties.geometryColumnName",
+                           f"Selected column {column_name} is numeric; please select a geometry (WKT or WKB), point struct or H3 cell column.",
+                           SeverityLevelEnum.Error))
+        elif component.properties.geometryType == "auto" and column_type in ["long", "bigint"]:
+            diagnostics.append(
+                Diagnostic("component.properties.geometryType",
+                           f"Column {column_name} is a long and is buffered as an H3 cell centre; choose H3 Cell (centre) to confirm.",
+                           SeverityLevelEnum.Warning))
+
+        return diagnostics
 
     def onChange(self, context: SqlContext, oldState: Component, newState: Component) -> Component:
         # Handle changes in the component's state and return the new state
@@ -96,6 +121,17 @@ class Buffer(MacroSpec):
         )
         return newState.bindProperties(newProperties)
 
+    def column_type(self, schema: str, column_name: str) -> str:
+        # data type of the geometry column, '' when unknown
+        data_types = {field["name"]: str(field["dataType"]).lower() for field in json.loads(schema or '[]')}
+        return data_types.get(column_name, "")
+
+    def geometry_format(self, props: BufferProperties) -> str:
+        # geomFormat passed to the macro, resolving "auto" from the column type
+        if props.geometryType != "auto":
+            return props.geometryType
+        return {"binary": "wkb", "struct": "struct", "long": "h3", "bigint": "h3"}.get(self.column_type(props.schema, props.geometryColumnName), "wkt")
+
     def apply(self, props: BufferProperties) -> str:
         # Get the table name
         table_name: str = ",".join(str(rel) for rel in props.relation_name)
@@ -108,7 +144,8 @@ class Buffer(MacroSpec):
             props.schema,
             f"'{props.geometryColumnName}'",            
             str(props.distance),
-            f"'{props.unit}'"
+            f"'{props.unit}'",
+            f"'{self.geometry_format(props)}'"
         ]
 
         params = ",".join([param for param in arguments])
@@ -123,7 +160,8 @@ class Buffer(MacroSpec):
             schema=parametersMap.get('schema'),
             geometryColumnName=parametersMap.get('geometryColumnName'),
             distance=int(parametersMap.get('distance')),
-            unit=str(parametersMap.get('unit'))
+            unit=str(parametersMap.get('unit')),
+            geometryType=parametersMap.get('geometryType', 'auto')
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -136,7 +174,8 @@ class Buffer(MacroSpec):
                 MacroParameter("schema", str(properties.schema)),
                 MacroParameter("destinationColumnNames", properties.geometryColumnName),
                 MacroParameter("distance", str(properties.distance)),
-                MacroParameter("unit", properties.unit)
+                MacroParameter("unit", properties.unit),
+                MacroParameter("geometryType", properties.geometryType)
             ]
         )
 
@@ -31,6 +31,8 @@ class CreatePoint(MacroSpec):
     class CreatePointProperties(MacroProperties):
         addFields: List[MatchField] = field(default_factory=list)
         relation_name: List[str] = field(default_factory=list)
+        outputFormat: str = "wkt"
+        h3Resolution: int = 7
 
     def get_relation_names(self, component: Component, context: SqlContext):
         all_upstream_nodes = []
@@ -68,10 +70,34 @@ class CreatePoint(MacroSpec):
                         "\n"
                         "* **Longitude Column Name** - Column containing Longitude values \n"
                         "* **Latitude Column Name** - Column containing Latitude values \n"
-                        "* **Target Column Name** - Target column name to keep transformed Geo Spatial Data \n"
+                        "* **Target Column Name** - Target column name to keep transformed Geo Spatial Data \n\n"
+                        "Points are written as WKT text by default. WKB, a `struct<lon: double, lat: double>` or an H3 cell id are smaller and are read by Distance, FindNearest, SpatialMatch and Buffer without parsing text.\n"
                     )
                 ]
             )
+        ) \
+            .addElement(
+            ColumnsLayout(gap=("1rem"))
+                .addColumn(
+                SelectBox("Output Format")
+                    .addOption("WKT Text", "wkt")
+                    .addOption("WKB Binary", "wkb")
+                    .addOption("Struct (lon, lat)", "struct")
+                    .addOption("H3 Cell", "h3")
+                    .bindProperty("outputFormat")
+            )
+                .addColumn(
+                Condition()
+                    .ifEqual(
+                    PropExpr("component.properties.outputFormat"),
+                    StringExpr("h3"),
+                )
+                    .then(
+                    NumberBox("H3 Resolution", placeholder="7", minValueVar=0, maxValueVar=15)
+                        .bindProperty("h3Resolution")
+                )
+            )
+                .addColumn()
         ) \
             .addElement(
             StepContainer()
@@ -208,7 +234,9 @@ class CreatePoint(MacroSpec):
 
         arguments = [
             "'" + table_name + "'",
-            str(grouped_fields)
+            str(grouped_fields),
+            "'" + props.outputFormat + "'",
+            str(props.h3Resolution)
         ]
         params = ",".join([param for param in arguments])
         return f'{{{{ {resolved_macro_name}({params}) }}}}'
@@ -217,7 +245,9 @@ class CreatePoint(MacroSpec):
         # load the component's state given default macro property representation
         parametersMap = self.convertToParameterMap(properties.parameters)
         return CreatePoint.CreatePointProperties(
-            relation_name=parametersMap.get('relation_name')
+            relation_name=parametersMap.get('relation_name'),
+            outputFormat=parametersMap.get('outputFormat', 'wkt'),
+            h3Resolution=int(parametersMap.get('h3Resolution', '7'))
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -226,7 +256,9 @@ class CreatePoint(MacroSpec):
             macroName=self.name,
             projectName=self.projectName,
             parameters=[
-                MacroParameter("relation_name", str(properties.relation_name))
+                MacroParameter("relation_name", str(properties.relation_name)),
+                MacroParameter("outputFormat", properties.outputFormat),
+                MacroParameter("h3Resolution", str(properties.h3Resolution))
             ],
         )
 
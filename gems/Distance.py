@@ -27,13 +27,21 @@ class Distance(MacroSpec):
         columnNames: List[str] = field(default_factory=list)
         sourceColumnNames: str = ""
         destinationColumnNames: str = ""
-        sourceType: str = "point"
-        destinationType: str = "point"
+        sourceType: str = "auto"
+        destinationType: str = "auto"
         outputDistance: bool = False
         units: str = "kms"
         outputCardDirection: bool = False
         outputDirectionDegrees: bool = False
         relation_name: List[str] = field(default_factory=list)
+        sourceLatColumnName: str = ""
+        destinationLatColumnName: str = ""
+        distanceMode: str = "rows"
+        destinationSchema: str = ''
+        maxDistance: float = 0
+        sourceGroupColumnName: str = ""
+        destinationGroupColumnName: str = ""
+        formula: str = "haversine"
 
     def get_relation_names(self, component: Component, context: SqlContext):
         all_upstream_nodes = []
@@ -64,7 +72,7 @@ class Distance(MacroSpec):
         dialog = Dialog("Distance") \
             .addElement(
             ColumnsLayout(gap="1rem", height="100%")
-                .addColumn(Ports(), "content")
+                .addColumn(Ports(allowInputAddOrDelete=True), "content")
                 .addColumn(
                 StackLayout(height="100%")
                     .addElement(
@@ -79,7 +87,26 @@ class Distance(MacroSpec):
                                 .addElement(
                                 ColumnsLayout(gap="1rem", height="100%")
                                     .addColumn(
-                                    SelectBox("Source Type").addOption("Point", "point").bindProperty("sourceType")
+                                    SelectBox("Mode")
+                                        .addOption("Source and Destination in Each Row", "rows")
+                                        .addOption("Distance Matrix Between Two Inputs", "matrix")
+                                        .bindProperty("distanceMode")
+                                )
+                                    .addColumn()
+                                    .addColumn()
+                                    .addColumn()
+                            )
+                                .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                    .addColumn(
+                                    SelectBox("Source Type")
+                                        .addOption("Detect from Column Type", "auto")
+                                        .addOption("Point (WKT)", "point")
+                                        .addOption("Longitude / Latitude Columns", "lonlat")
+                                        .addOption("Point Struct (lon, lat)", "struct")
+                                        .addOption("Point (WKB)", "wkb")
+                                        .addOption("H3 Cell (centre)", "h3")
+                                        .bindProperty("sourceType")
                                 )
                                     .addColumn(
                                     SchemaColumnsDropdown("Source Column")
@@ -87,13 +114,117 @@ class Distance(MacroSpec):
                                         .bindProperty("sourceColumnNames")
                                 )
                                     .addColumn(
-                                    SelectBox("Destination Type").addOption("Point", "point").bindProperty(
-                                        "destinationType")
+                                    SelectBox("Destination Type")
+                                        .addOption("Detect from Column Type", "auto")
+                                        .addOption("Point (WKT)", "point")
+                                        .addOption("Longitude / Latitude Columns", "lonlat")
+                                        .addOption("Point Struct (lon, lat)", "struct")
+                                        .addOption("Point (WKB)", "wkb")
+                                        .addOption("H3 Cell (centre)", "h3")
+                                        .bindProperty("destinationType")
                                 )
                                     .addColumn(
-                                    SchemaColumnsDropdown("Destination Column")
-                                        .bindSchema("component.ports.inputs[0].schema")
-                                        .bindProperty("destinationColumnNames")
+                                    StackLayout()
+                                        .addElement(
+                                        Condition()
+                                            .ifEqual(
+                                            PropExpr("component.properties.distanceMode"),
+                                            StringExpr("rows"),
+                                        )
+                                            .then(
+                                            SchemaColumnsDropdown("Destination Column")
+                                                .bindSchema("component.ports.inputs[0].schema")
+                                                .bindProperty("destinationColumnNames")
+                                        )
+                                    )
+                                        .addElement(
+                                        Condition()
+                                            .ifEqual(
+                                            PropExpr("component.properties.distanceMode"),
+                                            StringExpr("matrix"),
+                                        )
+                                            .then(
+                                            SchemaColumnsDropdown("Destination Column")
+                                                .bindSchema("component.ports.inputs[1].schema")
+                                                .bindProperty("destinationColumnNames")
+                                        )
+                                    )
+                                )
+                            )
+                                .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                    .addColumn()
+                                    .addColumn(
+                                    Condition()
+                                        .ifEqual(
+                                        PropExpr("component.properties.sourceType"),
+                                        StringExpr("lonlat"),
+                                    )
+                                        .then(
+                                        SchemaColumnsDropdown("Source Latitude Column")
+                                            .bindSchema("component.ports.inputs[0].schema")
+                                            .bindProperty("sourceLatColumnName")
+                                    )
+                                )
+                                    .addColumn()
+                                    .addColumn(
+                                    Condition()
+                                        .ifEqual(
+                                        PropExpr("component.properties.destinationType"),
+                                        StringExpr("lonlat"),
+                                    )
+                                        .then(
+                                        StackLayout()
+                                            .addElement(
+                                            Condition()
+                                                .ifEqual(
+                                                PropExpr("component.properties.distanceMode"),
+                                                StringExpr("rows"),
+                                            )
+                                                .then(
+                                                SchemaColumnsDropdown("Destination Latitude Column")
+                                                    .bindSchema("component.ports.inputs[0].schema")
+                                                    .bindProperty("destinationLatColumnName")
+                                            )
+                                        )
+                                            .addElement(
+                                            Condition()
+                                                .ifEqual(
+                                                PropExpr("component.properties.distanceMode"),
+                                                StringExpr("matrix"),
+                                            )
+                                                .then(
+                                                SchemaColumnsDropdown("Destination Latitude Column")
+                                                    .bindSchema("component.ports.inputs[1].schema")
+                                                    .bindProperty("destinationLatColumnName")
+                                            )
+                                        )
+                                    )
+                                )
+                            )
+                                .addElement(
+                                Condition()
+                                    .ifEqual(
+                                    PropExpr("component.properties.distanceMode"),
+                                    StringExpr("matrix"),
+                                )
+                                    .then(
+                                    ColumnsLayout(gap="1rem", height="100%")
+                                        .addColumn(
+                                        SchemaColumnsDropdown("Source Group Column (optional)")
+                                            .bindSchema("component.ports.inputs[0].schema")
+                                            .bindProperty("sourceGroupColumnName")
+                                    )
+                                        .addColumn(
+                                        SchemaColumnsDropdown("Destination Group Column (optional)")
+                                            .bindSchema("component.ports.inputs[1].schema")
+                                            .bindProperty("destinationGroupColumnName")
+                                    )
+                                        .addColumn(
+                                        NumberBox("Maximum Distance (0 for no limit, in the selected units)", placeholder="0", minValueVar=0)
+                                            .bindProperty("maxDistance")
+                                    )
+                                        .addColumn()
                                 )
                             )
                         )
@@ -121,6 +252,13 @@ class Distance(MacroSpec):
                                                                                                     "mls").addOption(
                                             "Feet", "feet").addOption("Meters", "mtr").bindProperty("units")
                                     )
+                                        .addElement(
+                                        SelectBox("Formula")
+                                            .addOption("Haversine (sphere)", "haversine")
+                                            .addOption("Equirectangular (fast, short distances)", "equirectangular")
+                                            .addOption("Vincenty (WGS84 ellipsoid, most accurate)", "vincenty")
+                                            .bindProperty("formula")
+                                    )
                                 )
                             )
                                 .addElement(Checkbox("Output Cardinal Direction").bindProperty("outputCardDirection"))
@@ -134,7 +272,10 @@ class Distance(MacroSpec):
                         _children=[
                             Markdown(
                                 "This gem requires that the Source Column and Destination Column contain geometric values in Well-Known Text (WKT) format. To convert longitude and latitude coordinates into WKT format, use the [CreatePoint gem](https://docs.prophecy.io/analysts/create-point/).\n\n"
-                                "Example: If your table has columns like `source_longitude`, `source_latitude`, `target_longitude`, and `target_latitude`, first use the CreatePoint Gem to generate `source_geopoint` and `target_geopoint` columns in WKT format. Then, you can use the Distance gem to calculate the distance between the source and target points."
+                                "Example: If your table has columns like `source_longitude`, `source_latitude`, `target_longitude`, and `target_latitude`, first use the CreatePoint Gem to generate `source_geopoint` and `target_geopoint` columns in WKT format. Then, you can use the Distance gem to calculate the distance between the source and target points.\n\n"
+                                "Numeric longitude/latitude columns, point structs, WKB points and H3 cells (their centre) can also be used directly; with **Detect from Column Type** the type follows the column's data type, matching each CreatePoint output format. With **Longitude / Latitude Columns** the Source/Destination Column is the longitude and a second column holds the latitude; this skips building and re-parsing WKT text entirely.\n\n"
+                                "**Distance Matrix** takes the destinations from a second input and returns one row per source/destination pair, with destination columns prefixed by `target_`. Set group columns to only pair rows of the same group (e.g. region), and a maximum distance to only return nearby pairs; both keep the matrix sparse instead of building every pair.\n\n"
+                                "**Formula**: Haversine treats the earth as a sphere (within 0.6% of the true distance). Equirectangular is cheaper and within 0.01% of Haversine up to 100 km below 70° latitude, but grows inaccurate over long distances. Vincenty follows the WGS84 ellipsoid to the millimetre and is the slowest."
                             )
                         ]
                     )
@@ -161,6 +302,29 @@ class Distance(MacroSpec):
 
         # Extract all column names from the schema
         field_names = [field["name"] for field in component.ports.inputs[0].schema["fields"]]
+        destination_field_names = field_names
+
+        if component.properties.distanceMode == "matrix":
+            if len(component.ports.inputs) < 2:
+                diagnostics.append(
+                    Diagnostic("component.properties.distanceMode", f"Please add a second input with the destinations",
+                               SeverityLevelEnum.Error))
+            else:
+                destination_field_names = [field["name"] for field in component.ports.inputs[1].schema["fields"]]
+                if (len(component.properties.sourceGroupColumnName) > 0) != (len(component.properties.destinationGroupColumnName) > 0):
+                    diagnostics.append(
+                        Diagnostic("component.properties.sourceGroupColumnName",
+                                   f"Please select a group column for both inputs, or for neither",
+                                   SeverityLevelEnum.Error))
+                for group_property, group_column, group_field_names in [
+                    ("sourceGroupColumnName", component.properties.sourceGroupColumnName, field_names),
+                    ("destinationGroupColumnName", component.properties.destinationGroupColumnName, destination_field_names),
+                ]:
+                    if len(group_column) > 0 and group_column not in group_field_names:
+                        diagnostics.append(
+                            Diagnostic(f"component.properties.{group_property}",
+                                       f"Selected group column {group_column} is not present in input schema.",
+                                       SeverityLevelEnum.Error))
 
         if len(component.properties.sourceColumnNames) > 0:
             if component.properties.sourceColumnNames not in field_names:
@@ -170,12 +334,43 @@ class Distance(MacroSpec):
                                SeverityLevelEnum.Error))
 
         if len(component.properties.destinationColumnNames) > 0:
-            if component.properties.destinationColumnNames not in field_names:
+            if component.properties.destinationColumnNames not in destination_field_names:
                 diagnostics.append(
                     Diagnostic("component.properties.destinationColumnNames",
                                f"Selected recordId column {component.properties.destinationColumnNames} is not present in input schema.",
                                SeverityLevelEnum.Error))
 
+        for type_property, lat_property, lat_field_names in [("sourceType", "sourceLatColumnName", field_names),
+                                                             ("destinationType", "destinationLatColumnName", destination_field_names)]:
+            if getattr(component.properties, type_property) == "lonlat":
+                lat_column = getattr(component.properties, lat_property)
+                if len(lat_column) == 0:
+                    diagnostics.append(
+                        Diagnostic(f"component.properties.{lat_property}", f"Please select a latitude column",
+                                   SeverityLevelEnum.Error))
+                elif lat_column not in lat_field_names:
+                    diagnostics.append(
+                        Diagnostic(f"component.properties.{lat_property}",
+                                   f"Selected latitude column {lat_column} is not present in input schema.",
+                                   SeverityLevelEnum.Error))
+
+        destination_schema = component.properties.destinationSchema if component.properties.distanceMode == "matrix" else component.properties.schema
+        for column_property, type_property, schema in [("sourceColumnNames", "sourceType", component.properties.schema),
+                                                       ("destinationColumnNames", "destinationType", destination_schema)]:
+            column_name = getattr(component.properties, column_property)
+            point_type = getattr(component.properties, type_property)
+            column_type = self.column_type(schema, column_name)
+            if point_type in ["auto", "point"] and column_type.startswith(("double", "float", "integer", "short", "byte", "decimal")):
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{column_property}",
+                               f"Selected column {column_name} is numeric; please pick Longitude / Latitude Columns or a point column.",
+                               SeverityLevelEnum.Error))
+            elif point_type == "auto" and column_type in ["long", "bigint"]:
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{type_property}",
+                               f"Column {column_name} is a long and is read as an H3 cell id; choose H3 Cell (centre) to confirm.",
+                               SeverityLevelEnum.Warning))
+
         if not component.properties.outputDistance:
             if not component.properties.outputCardDirection:
                 if not component.properties.outputDirectionDegrees:
@@ -195,30 +390,67 @@ class Distance(MacroSpec):
         newProperties = dataclasses.replace(
             newState.properties,
             schema=json.dumps(fields_array),
+            destinationSchema=self.destination_schema(newState),
             relation_name=relation_name
         )
         return newState.bindProperties(newProperties)
 
+    def destination_schema(self, component: Component) -> str:
+        # schema of the optional second (matrix destination) input
+        if len(component.ports.inputs) < 2:
+            return ''
+        schema = json.loads(str(component.ports.inputs[1].schema).replace("'", '"'))
+        return json.dumps([{"name": field["name"], "dataType": field["dataType"]["type"]} for field in schema["fields"]])
+
+    def column_type(self, schema: str, column_name: str) -> str:
+        # data type of a column in a stored schema, '' when unknown
+        data_types = {field["name"]: str(field["dataType"]).lower() for field in json.loads(schema or '[]')}
+        return data_types.get(column_name, "")
+
+    def point_type(self, schema: str, column_name: str) -> str:
+        # source / destination type "auto" stands for; long columns are H3 cells
+        return {"binary": "wkb", "struct": "struct", "long": "h3", "bigint": "h3"}.get(self.column_type(schema, column_name), "point")
+
     def apply(self, props: DistanceProperties) -> str:
         # Get the table name
-        table_name: str = ",".join(str(rel) for rel in props.relation_name)
+        matrix = props.distanceMode == "matrix" and len(props.relation_name) > 1
+        if matrix:
+            table_name: str = str(props.relation_name[0])
+        else:
+            table_name: str = ",".join(str(rel) for rel in props.relation_name)
+        destinationAllColumnNames = [field["name"] for field in json.loads(props.destinationSchema)] if matrix else []
 
         # Get existing column names
         allColumnNames = [field["name"] for field in json.loads(props.schema)]
 
+        sourceType = props.sourceType
+        if sourceType == "auto":
+            sourceType = self.point_type(props.schema, props.sourceColumnNames)
+        destinationType = props.destinationType
+        if destinationType == "auto":
+            destinationType = self.point_type(props.destinationSchema if matrix else props.schema, props.destinationColumnNames)
+
         # generate the actual macro call given the component's state
         resolved_macro_name = f"{self.projectName}.{self.name}"
         arguments = [
             "'" + table_name + "'",
             "'" + props.sourceColumnNames + "'",
             "'" + props.destinationColumnNames + "'",
-            "'" + str(props.sourceType) + "'",
-            "'" + str(props.destinationType) + "'",
+            "'" + str(sourceType) + "'",
+            "'" + str(destinationType) + "'",
             str(props.outputDistance).lower(),
             "'" + str(props.units) + "'",
             str(props.outputCardDirection).lower(),
             str(props.outputDirectionDegrees).lower(),
-            str(allColumnNames)
+            str(allColumnNames),
+            "'" + props.sourceLatColumnName + "'",
+            "'" + props.destinationLatColumnName + "'",
+            "'" + (str(props.relation_name[1]) if matrix else "") + "'",
+            str(destinationAllColumnNames),
+            str(props.maxDistance),
+            "'" + props.sourceGroupColumnName + "'",
+            "'" + props.destinationGroupColumnName + "'",
+            "'" + props.formula + "'"
         ]
         params = ",".join([param for param in arguments])
         return f'{{{{ {resolved_macro_name}({params}) }}}}'
@@ -237,7 +469,15 @@ class Distance(MacroSpec):
             outputDistance=parametersMap.get('outputDistance').lower() == 'true',
             units=parametersMap.get('units'),
             outputCardDirection=parametersMap.get('outputCardDirection').lower() == 'true',
-            outputDirectionDegrees=parametersMap.get('outputDirectionDegrees').lower() == 'true'
+            outputDirectionDegrees=parametersMap.get('outputDirectionDegrees').lower() == 'true',
+            sourceLatColumnName=parametersMap.get('sourceLatColumnName', ''),
+            destinationLatColumnName=parametersMap.get('destinationLatColumnName', ''),
+            distanceMode=parametersMap.get('distanceMode', 'rows'),
+            destinationSchema=parametersMap.get('destinationSchema', ''),
+            maxDistance=float(parametersMap.get('maxDistance', '0')),
+            sourceGroupColumnName=parametersMap.get('sourceGroupColumnName', ''),
+            destinationGroupColumnName=parametersMap.get('destinationGroupColumnName', ''),
+            formula=parametersMap.get('formula', 'haversine')
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -255,7 +495,15 @@ class Distance(MacroSpec):
                 MacroParameter("outputDistance", str(properties.outputDistance).lower()),
                 MacroParameter("units", properties.units),
                 MacroParameter("outputCardDirection", str(properties.outputCardDirection).lower()),
-                MacroParameter("outputDirectionDegrees", str(properties.outputDirectionDegrees).lower())
+                MacroParameter("outputDirectionDegrees", str(properties.outputDirectionDegrees).lower()),
+                MacroParameter("sourceLatColumnName", properties.sourceLatColumnName),
+                MacroParameter("destinationLatColumnName", properties.destinationLatColumnName),
+                MacroParameter("distanceMode", properties.distanceMode),
+                MacroParameter("destinationSchema", str(properties.destinationSchema)),
+                MacroParameter("maxDistance", str(properties.maxDistance)),
+                MacroParameter("sourceGroupColumnName", properties.sourceGroupColumnName),
+                MacroParameter("destinationGroupColumnName", properties.destinationGroupColumnName),
+                MacroParameter("formula", properties.formula)
             ],
         )
 
@@ -268,6 +516,7 @@ class Distance(MacroSpec):
         newProperties = dataclasses.replace(
             component.properties,
             schema=json.dumps(fields_array),
+            destinationSchema=self.destination_schema(component),
             relation_name=relation_name
         )
         return component.bindProperties(newProperties)
\ No newline at end of file
@@ -29,12 +29,22 @@ class FindNearest(MacroSpec):
         columnNames: List[str] = field(default_factory=list)
         sourceColumnName: str = ""
         destinationColumnName: str = ""
-        sourceType: str = "point"
-        targetType: str = "point"
+        sourceType: str = "auto"
+        targetType: str = "auto"
         nearestPoints: int = 1
         maxDistance: int = 20
         units: str = "kms"
         ignoreZeroDistance: bool = False
+        searchMethod: str = "bruteforce"
+        searchResolution: int = 7
+        outputDirection: bool = True
+        sourceKeyColumn: str = ""
+        rankMethod: str = "window"
+        sortOutput: bool = True
+        joinStrategy: str = "auto"
+        sourceRowCount: int = 0
+        targetRowCount: int = 0
+        formula: str = "haversine"
 
     def get_relation_names(self, component: Component, context: SqlContext):
         all_upstream_nodes = []
@@ -80,7 +90,7 @@ class FindNearest(MacroSpec):
                                 .addElement(
                                 ColumnsLayout(gap="1rem", height="100%")
                                     .addColumn(
-                                    SelectBox("Source Centroid Type").addOption("Point", "point").bindProperty("sourceType")
+                                    SelectBox("Source Centroid Type").addOption("Detect from Column Type", "auto").addOption("Point (WKT)", "point").addOption("Point (WKB)", "wkb").addOption("Point Struct (lon, lat)", "struct").addOption("H3 Cell (centre)", "h3").bindProperty("sourceType")
                                 )
                                     .addColumn(
                                     SchemaColumnsDropdown("Source Centroid Column")
@@ -88,7 +98,7 @@ class FindNearest(MacroSpec):
                                         .bindProperty("sourceColumnName")
                                 )
                                     .addColumn(
-                                    SelectBox("Target Centroid Type").addOption("Point", "point").bindProperty("targetType")
+                                    SelectBox("Target Centroid Type").addOption("Detect from Column Type", "auto").addOption("Point (WKT)", "point").addOption("Point (WKB)", "wkb").addOption("Point Struct (lon, lat)", "struct").addOption("H3 Cell (centre)", "h3").bindProperty("targetType")
                                 )
                                     .addColumn(
                                     SchemaColumnsDropdown("Target Centroid Column")
@@ -96,6 +106,17 @@ class FindNearest(MacroSpec):
                                         .bindProperty("destinationColumnName")
                                 )
                             )
+                                .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                    .addColumn(
+                                    SchemaColumnsDropdown("Source Key Column (optional, unique per row)")
+                                        .bindSchema("component.ports.inputs[0].schema")
+                                        .bindProperty("sourceKeyColumn")
+                                )
+                                    .addColumn()
+                                    .addColumn()
+                                    .addColumn()
+                            )
                         )
                     )
 
@@ -134,11 +155,94 @@ class FindNearest(MacroSpec):
                                     .addColumn(
                                                 SelectBox("").addOption("Kilometers", "kms").addOption("Miles","mls").addOption("Feet", "feet").addOption("Meters", "mtr").bindProperty("units")
                                     )
-                                    .addColumn()
+                                    .addColumn(
+                                                SelectBox("Formula")
+                                                .addOption("Haversine (sphere)", "haversine")
+                                                .addOption("Equirectangular (fast, short distances)", "equirectangular")
+                                                .addOption("Vincenty (WGS84 ellipsoid, most accurate)", "vincenty")
+                                                .bindProperty("formula")
+                                    )
                                     .addColumn()
                                     .addColumn()
                             )
                             .addElement(Checkbox("Ignore 0 Distance Matches").bindProperty("ignoreZeroDistance"))
+                            .addElement(Checkbox("Output Cardinal Direction").bindProperty("outputDirection"))
+                            .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                .addColumn(
+                                            SelectBox("Top-N Method")
+                                            .addOption("Window (rank every candidate)", "window")
+                                            .addOption("Aggregate (small number of nearest points)", "aggregate")
+                                            .bindProperty("rankMethod")
+                                )
+                                .addColumn()
+                                .addColumn()
+                                .addColumn()
+                                .addColumn()
+                            )
+                            .addElement(Checkbox("Sort Output by Source Location").bindProperty("sortOutput"))
+                            .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                .addColumn(
+                                            SelectBox("Join Strategy")
+                                            .addOption("Auto", "auto")
+                                            .addOption("Broadcast Target", "broadcast_target")
+                                            .addOption("Broadcast Source", "broadcast_source")
+                                            .addOption("Shuffle Partitioned", "shuffle")
+                                            .bindProperty("joinStrategy")
+                                )
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.joinStrategy"),
+                                        StringExpr("auto"),
+                                    )
+                                    .then(
+                                        NumberBox("Estimated Source Rows (0 if unknown)", placeholder="0", minValueVar=0)
+                                        .bindProperty("sourceRowCount")
+                                    )
+                                )
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.joinStrategy"),
+                                        StringExpr("auto"),
+                                    )
+                                    .then(
+                                        NumberBox("Estimated Target Rows (0 if unknown)", placeholder="0", minValueVar=0)
+                                        .bindProperty("targetRowCount")
+                                    )
+                                )
+                                .addColumn()
+                                .addColumn()
+                            )
+                            .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                .addColumn(
+                                            SelectBox("Search Method")
+                                            .addOption("Brute Force (compare every pair)", "bruteforce")
+                                            .addOption("H3 Index (prune by Maximum Distance)", "h3index")
+                                            .bindProperty("searchMethod")
+                                )
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.searchMethod"),
+                                        StringExpr("h3index"),
+                                    )
+                                    .then(
+                                        NumberBox("H3 Resolution (Maximum Distance 0)",
+                                                placeholder="7",
+                                                minValueVar=0,
+                                                maxValueVar=15
+                                                )
+                                        .bindProperty("searchResolution")
+                                    )
+                                )
+                                .addColumn()
+                                .addColumn()
+                                .addColumn()
+                            )
                         )
                     )
                 )
@@ -147,8 +251,10 @@ class FindNearest(MacroSpec):
                         variant="success",
                         _children=[
                             Markdown(
-                                "This gem requires that the Source Column and Destination Column contain geometric values in Well-Known Text (WKT) format. To convert longitude and latitude coordinates into WKT format, use the [CreatePoint gem](https://docs.prophecy.io/analysts/create-point/).\n\n"
-                                "Example: If your table has columns like `source_longitude`, `source_latitude`, `target_longitude`, and `target_latitude`, first use the CreatePoint Gem to generate `source_geopoint` and `target_geopoint` columns in WKT format."
+                                "This gem requires that the Source Column and Destination Column contain points, as Well-Known Text (WKT), WKB, a struct<lon, lat> or an H3 cell id (all CreatePoint output formats; **Detect from Column Type** picks the format from the column's data type). To convert longitude and latitude coordinates into points, use the [CreatePoint gem](https://docs.prophecy.io/analysts/create-point/).\n\n"
+                                "Example: If your table has columns like `source_longitude`, `source_latitude`, `target_longitude`, and `target_latitude`, first use the CreatePoint Gem to generate `source_geopoint` and `target_geopoint` columns in WKT format.\n\n"
+                                "**H3 Index** with a Maximum Distance of 0 searches outward in growing rings of H3 cells at the chosen resolution until each source point has enough neighbours. Pick a resolution whose cells are close to the typical spacing of the target points.\n\n"
+                                "**Formula**: Haversine treats the earth as a sphere (within 0.6% of the true distance). Equirectangular is cheaper and within 0.01% of Haversine up to 100 km below 70° latitude, but grows inaccurate over long distances. Vincenty follows the WGS84 ellipsoid to the millimetre and is the slowest."
                             )
                         ]
                     )
@@ -191,6 +297,40 @@ class FindNearest(MacroSpec):
                                f"Selected column {component.properties.destinationColumnName} is not present in input schema.",
                                SeverityLevelEnum.Error))
 
+        if len(component.properties.sourceKeyColumn) > 0:
+            if component.properties.sourceKeyColumn not in source_field_names:
+                diagnostics.append(
+                    Diagnostic("component.properties.sourceKeyColumn",
+                               f"Selected column {component.properties.sourceKeyColumn} is not present in input schema.",
+                               SeverityLevelEnum.Error))
+
+        # the unbounded H3 search tells keyless rows apart by a hash of the row, which map columns do not allow
+        expanding_rings = component.properties.searchMethod == "h3index" and component.properties.maxDistance <= 0
+        source_types = [str(field["dataType"]).lower() for field in json.loads(component.properties.source_schema or '[]')]
+        if expanding_rings and len(component.properties.sourceKeyColumn) == 0 and "map" in source_types:
+            diagnostics.append(
+                Diagnostic("component.properties.sourceKeyColumn",
+                           "Please select a source key column, the source has map columns that cannot be hashed into a row id.",
+                           SeverityLevelEnum.Error))
+
+        for column_property, type_property, schema in [
+            ("sourceColumnName", "sourceType", component.properties.source_schema),
+            ("destinationColumnName", "targetType", component.properties.target_schema),
+        ]:
+            column_name = getattr(component.properties, column_property)
+            point_type = getattr(component.properties, type_property)
+            column_type = self.column_type(schema, column_name)
+            if point_type in ["auto", "point"] and column_type.startswith(("double", "float", "integer", "short", "byte", "decimal")):
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{column_property}",
+                               f"Selected column {column_name} is numeric; please select a point (WKT or WKB), point struct or H3 cell column.",
+                               SeverityLevelEnum.Error))
+            elif point_type == "auto" and column_type in ["long", "bigint"]:
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{type_property}",
+                               f"Column {column_name} is a long and is read as an H3 cell id; choose H3 Cell (centre) to confirm.",
+                               SeverityLevelEnum.Warning))
+
         return diagnostics
 
     def onChange(self, context: SqlContext, oldState: Component, newState: Component) -> Component:
@@ -211,25 +351,78 @@ class FindNearest(MacroSpec):
         )
         return newState.bindProperties(newProperties)
 
+    def resolve_join_strategy(self, props: FindNearestProperties) -> str:
+        # Auto broadcasts the smaller input when its estimated size (row count x row width
+        # from the schema captured in onChange) fits comfortably in memory; otherwise Spark decides
+        if props.joinStrategy != "auto":
+            return props.joinStrategy
+
+        broadcast_limit_bytes = 64 * 1024 * 1024
+        type_widths = {
+            "boolean": 1, "byte": 1, "tinyint": 1, "short": 2, "smallint": 2,
+            "integer": 4, "int": 4, "float": 4, "date": 4,
+            "long": 8, "bigint": 8, "double": 8, "timestamp": 8,
+            "decimal": 16, "string": 32
+        }
+
+        def estimated_bytes(schema, row_count):
+            if row_count <= 0:
+                return None
+            row_width = sum(type_widths.get(str(field["dataType"]).lower(), 32) for field in json.loads(schema))
+            return row_count * row_width
+
+        estimates = [
+            (estimated_bytes(props.target_schema, props.targetRowCount), "broadcast_target"),
+            (estimated_bytes(props.source_schema, props.sourceRowCount), "broadcast_source")
+        ]
+        candidates = [(size, strategy) for size, strategy in estimates if size is not None and size <= broadcast_limit_bytes]
+        if len(candidates) == 0:
+            return "auto"
+        return min(candidates)[1]
+
+    def column_type(self, schema: str, column_name: str) -> str:
+        # data type of a column in a schema captured by onChange, '' when unknown
+        data_types = {field["name"]: str(field["dataType"]).lower() for field in json.loads(schema or '[]')}
+        return data_types.get(column_name, "")
+
+    def point_type(self, schema: str, column_name: str) -> str:
+        # centroid type "auto" resolves to; validate warns when a long column becomes an H3 cell
+        return {"binary": "wkb", "struct": "struct", "long": "h3", "bigint": "h3"}.get(self.column_type(schema, column_name), "point")
+
     def apply(self, props: FindNearestProperties) -> str:
         # Get existing column names
         allSourceColumnNames = [field["name"] for field in json.loads(props.source_schema)]
         allTargetColumnNames = [field["name"] for field in json.loads(props.target_schema)]
 
+        sourceType = props.sourceType
+        if sourceType == "auto":
+            sourceType = self.point_type(props.source_schema, props.sourceColumnName)
+        targetType = props.targetType
+        if targetType == "auto":
+            targetType = self.point_type(props.target_schema, props.destinationColumnName)
+
         # generate the actual macro call given the component's state
         resolved_macro_name = f"{self.projectName}.{self.name}"
         arguments = [
             str(props.relation_name),
             "'" + props.sourceColumnName + "'",
             "'" + props.destinationColumnName + "'",
-            "'" + str(props.sourceType) + "'",
-            "'" + str(props.targetType) + "'",
+            "'" + str(sourceType) + "'",
+            "'" + str(targetType) + "'",
             str(props.nearestPoints),
             str(props.maxDistance),
             "'" + str(props.units) + "'",
             str(props.ignoreZeroDistance).lower(),
             str(allSourceColumnNames),
-            str(allTargetColumnNames)
+            str(allTargetColumnNames),
+            "'" + str(props.searchMethod) + "'",
+            str(props.searchResolution),
+            str(props.outputDirection).lower(),
+            "'" + props.sourceKeyColumn + "'",
+            "'" + str(props.rankMethod) + "'",
+            str(props.sortOutput).lower(),
+            "'" + self.resolve_join_strategy(props) + "'",
+            "'" + props.formula + "'"
         ]
         params = ",".join([param for param in arguments])
         return f'{{{{ {resolved_macro_name}({params}) }}}}'
@@ -249,7 +442,17 @@ class FindNearest(MacroSpec):
             nearestPoints=float(parametersMap.get('nearestPoints')),
             maxDistance=float(parametersMap.get('maxDistance')),
             units=parametersMap.get('units'),
-            ignoreZeroDistance=parametersMap.get('ignoreZeroDistance').lower() == 'true'
+            ignoreZeroDistance=parametersMap.get('ignoreZeroDistance').lower() == 'true',
+            searchMethod=parametersMap.get('searchMethod', 'bruteforce'),
+            searchResolution=int(parametersMap.get('searchResolution', '7')),
+            outputDirection=parametersMap.get('outputDirection', 'true').lower() == 'true',
+            sourceKeyColumn=parametersMap.get('sourceKeyColumn', ''),
+            rankMethod=parametersMap.get('rankMethod', 'window'),
+            sortOutput=parametersMap.get('sortOutput', 'true').lower() == 'true',
+            joinStrategy=parametersMap.get('joinStrategy', 'auto'),
+            sourceRowCount=int(parametersMap.get('sourceRowCount', '0')),
+            targetRowCount=int(parametersMap.get('targetRowCount', '0')),
+            formula=parametersMap.get('formula', 'haversine')
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -268,7 +471,17 @@ class FindNearest(MacroSpec):
                 MacroParameter("nearestPoints", str(properties.nearestPoints)),
                 MacroParameter("maxDistance", str(properties.maxDistance)),
                 MacroParameter("units", properties.units),
-                MacroParameter("ignoreZeroDistance", str(properties.ignoreZeroDistance).lower())
+                MacroParameter("ignoreZeroDistance", str(properties.ignoreZeroDistance).lower()),
+                MacroParameter("searchMethod", properties.searchMethod),
+                MacroParameter("searchResolution", str(properties.searchResolution)),
+                MacroParameter("outputDirection", str(properties.outputDirection).lower()),
+                MacroParameter("sourceKeyColumn", properties.sourceKeyColumn),
+                MacroParameter("rankMethod", properties.rankMethod),
+                MacroParameter("sortOutput", str(properties.sortOutput).lower()),
+                MacroParameter("joinStrategy", properties.joinStrategy),
+                MacroParameter("sourceRowCount", str(properties.sourceRowCount)),
+                MacroParameter("targetRowCount", str(properties.targetRowCount)),
+                MacroParameter("formula", properties.formula)
             ],
         )
 
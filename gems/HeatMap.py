@@ -28,6 +28,14 @@ class HeatMap(MacroSpec):
         decayType: str = "constant"
         resolution: int = 8
         gridDistance: int = 1
+        resolutionMode: str = "single"
+        minResolution: int = 5
+        incrementalColumn: str = ""
+        outputGeometry: str = "wkt"
+        outputCellId: bool = False
+        outputCentroid: bool = False
+        kernelBandwidth: float = 0
+        ringWeights: str = ""
 
     def get_relation_names(self, component: Component, context: SqlContext):
         all_upstream_nodes = []
@@ -104,9 +112,16 @@ class HeatMap(MacroSpec):
                                     .addOption("Constant", "constant")
                                     .addOption("Linear", "linear")
                                     .addOption("Exponential", "exp")
+                                    .addOption("Gaussian", "gaussian")
+                                    .addOption("Epanechnikov", "epanechnikov")
+                                    .addOption("Custom Ring Weights", "custom")
                                     .bindProperty("decayType")
                                 )
-                                .addColumn()
+                                .addColumn(
+                                    SchemaColumnsDropdown("Incremental Watermark Column (optional)")
+                                    .bindSchema("component.ports.inputs[0].schema")
+                                    .bindProperty("incrementalColumn")
+                                )
                                 .addColumn()
                             )
                             .addElement(
@@ -119,7 +134,72 @@ class HeatMap(MacroSpec):
                                     NumberBox("Grid Distance", placeholder="0", minValueVar=0)
                                     .bindProperty("gridDistance")
                                 )
+                                .addColumn(
+                                    SelectBox("Output Resolutions")
+                                    .addOption("Single Resolution", "single")
+                                    .addOption("Pyramid (range of resolutions)", "pyramid")
+                                    .bindProperty("resolutionMode")
+                                )
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.resolutionMode"),
+                                        StringExpr("pyramid"),
+                                    )
+                                    .then(
+                                        NumberBox("Coarsest Resolution", placeholder="5", minValueVar=0, maxValueVar=15)
+                                        .bindProperty("minResolution")
+                                    )
+                                )
+                            )
+                            .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.decayType"),
+                                        StringExpr("gaussian"),
+                                    )
+                                    .then(
+                                        NumberBox("Kernel Bandwidth in rings (0 for default)", placeholder="0", minValueVar=0)
+                                        .bindProperty("kernelBandwidth")
+                                    )
+                                )
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.decayType"),
+                                        StringExpr("epanechnikov"),
+                                    )
+                                    .then(
+                                        NumberBox("Kernel Bandwidth in rings (0 for default)", placeholder="0", minValueVar=0)
+                                        .bindProperty("kernelBandwidth")
+                                    )
+                                )
+                                .addColumn(
+                                    Condition()
+                                    .ifEqual(
+                                        PropExpr("component.properties.decayType"),
+                                        StringExpr("custom"),
+                                    )
+                                    .then(
+                                        TextBox("Ring Weights (comma separated, center first)", placeholder="1, 0.6, 0.2")
+                                        .bindProperty("ringWeights")
+                                    )
+                                )
                                 .addColumn()
+                            )
+                            .addElement(
+                                ColumnsLayout(gap="1rem", height="100%")
+                                .addColumn(
+                                    SelectBox("Output Geometry")
+                                    .addOption("Hexagon Boundary (WKT)", "wkt")
+                                    .addOption("Hexagon Boundary (WKB)", "wkb")
+                                    .addOption("None", "none")
+                                    .bindProperty("outputGeometry")
+                                )
+                                .addColumn(Checkbox("Output H3 Cell Id").bindProperty("outputCellId"))
+                                .addColumn(Checkbox("Output Centroid Lon/Lat").bindProperty("outputCentroid"))
                                 .addColumn()
                             )
                         )
@@ -136,7 +216,13 @@ class HeatMap(MacroSpec):
                                 "\n"
                                 "- **Grid Distance**: Defines the number of hexagon steps away from the center to generate surronding hexagons"
                                 "\n"
-                                "- **Decay Function**: Determines how heat fades with distance: constant applies equal weight to all neighbors, linear reduces weight linearly with distance, and exponential halves the weight with each step away"
+                                "- **Decay Function**: Determines how heat fades with distance: constant applies equal weight to all neighbors, linear reduces weight linearly with distance, exponential halves the weight with each step away, gaussian and epanechnikov follow those kernels over the ring distance (bandwidth in rings; by default gaussian uses a sigma of half the grid distance and epanechnikov reaches zero just past the outer ring), and custom uses one weight per ring, starting with the center cell"
+                                "\n"
+                                "- **Output Resolutions**: Pyramid returns every resolution from the coarsest one up to Resolution in a single relation with a `resolution` column. Points are read and binned once at the finest resolution, and coarser levels are rolled up from it"
+                                "\n"
+                                "- **Incremental Watermark Column**: For append-only inputs in an incremental model (unique key `h3_cell`). The output keeps each cell's raw heat and latest watermark; later runs only read points with a newer watermark and re-smooth only the cells around them"
+                                "\n"
+                                "- **Output Geometry**: The H3 cell id (BIGINT) is the most compact output and can be joined or converted later; boundary WKT is the largest and slowest to produce"
                             )
                         ]
                     )
@@ -200,6 +286,50 @@ class HeatMap(MacroSpec):
                     )
                 )
 
+        if component.properties.incrementalColumn != '' and component.properties.incrementalColumn not in field_names:
+            diagnostics.append(
+                Diagnostic("component.properties.incrementalColumn",
+                           f"Selected watermark column {component.properties.incrementalColumn} is not present in input schema.",
+                           SeverityLevelEnum.Error)
+            )
+
+        # incremental runs always keep h3_cell; otherwise the cells need a geometry or their id
+        if component.properties.outputGeometry == "none" and not component.properties.outputCellId \
+                and component.properties.incrementalColumn == '':
+            diagnostics.append(
+                Diagnostic("component.properties.outputGeometry",
+                           "Please output the cell geometry or the H3 cell id, otherwise the cells cannot be told apart.",
+                           SeverityLevelEnum.Error)
+            )
+
+        if component.properties.decayType == "custom":
+            ring_weights = self.parse_ring_weights(component.properties.ringWeights)
+            if ring_weights is None or len(ring_weights) == 0:
+                diagnostics.append(
+                    Diagnostic("component.properties.ringWeights",
+                               "Please enter the ring weights as comma separated numbers.",
+                               SeverityLevelEnum.Error)
+                )
+            elif len(ring_weights) > component.properties.gridDistance + 1:
+                diagnostics.append(
+                    Diagnostic("component.properties.ringWeights",
+                               "Please enter at most one weight per ring (grid distance + 1).",
+                               SeverityLevelEnum.Error)
+                )
+            elif any(weight < 0 for weight in ring_weights) or all(weight == 0 for weight in ring_weights):
+                diagnostics.append(
+                    Diagnostic("component.properties.ringWeights",
+                               "Ring weights must not be negative and at least one must be greater than 0.",
+                               SeverityLevelEnum.Error)
+                )
+
+        if component.properties.resolutionMode == "pyramid" and component.properties.minResolution > component.properties.resolution:
+            diagnostics.append(
+                Diagnostic("component.properties.minResolution",
+                           "Coarsest resolution must not be greater than the resolution.",
+                           SeverityLevelEnum.Error)
+            )
+
         return diagnostics
 
     def onChange(self, context: SqlContext, oldState: Component, newState: Component) -> Component:
@@ -212,6 +342,12 @@ class HeatMap(MacroSpec):
         )
         return newState.bindProperties(newProperties)
 
+    def parse_ring_weights(self, ring_weights: str):
+        try:
+            return [float(weight) for weight in ring_weights.split(",") if weight.strip() != ""]
+        except ValueError:
+            return None
+
     def apply(self, props: HeatMapProperties) -> str:
         # generate the actual macro call given the component's state
         resolved_macro_name = f"{self.projectName}.{self.name}"
@@ -226,7 +362,14 @@ class HeatMap(MacroSpec):
             str(props.resolution),
             str(props.gridDistance),
             "'" + props.heatColumnName + "'",
-            "'" + props.decayType + "'"
+            "'" + props.decayType + "'",
+            str(props.minResolution) if props.resolutionMode == "pyramid" else "none",
+            "'" + props.incrementalColumn + "'",
+            "'" + props.outputGeometry + "'",
+            str(props.outputCellId).lower(),
+            str(props.outputCentroid).lower(),
+            str(props.kernelBandwidth) if props.kernelBandwidth > 0 else "none",
+            str(self.parse_ring_weights(props.ringWeights) or [])
         ]
         params = ",".join([param for param in arguments])
         return f'{{{{ {resolved_macro_name}({params}) }}}}'
@@ -241,7 +384,15 @@ class HeatMap(MacroSpec):
             resolution=int(parametersMap.get('resolution')),
             gridDistance=int(parametersMap.get('gridDistance')),
             heatColumnName=parametersMap.get('heatColumnName'),
-            decayType=parametersMap.get('decayType')
+            decayType=parametersMap.get('decayType'),
+            resolutionMode=parametersMap.get('resolutionMode', 'single'),
+            minResolution=int(parametersMap.get('minResolution', '5')),
+            incrementalColumn=parametersMap.get('incrementalColumn', ''),
+            outputGeometry=parametersMap.get('outputGeometry', 'wkt'),
+            outputCellId=parametersMap.get('outputCellId', 'false').lower() == 'true',
+            outputCentroid=parametersMap.get('outputCentroid', 'false').lower() == 'true',
+            kernelBandwidth=float(parametersMap.get('kernelBandwidth', '0')),
+            ringWeights=parametersMap.get('ringWeights', '')
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -256,7 +407,15 @@ class HeatMap(MacroSpec):
                 MacroParameter("resolution", str(properties.resolution)),
                 MacroParameter("gridDistance", str(properties.gridDistance)),
                 MacroParameter("heatColumnName", str(properties.heatColumnName)),
-                MacroParameter("decayType", str(properties.decayType))
+                MacroParameter("decayType", str(properties.decayType)),
+                MacroParameter("resolutionMode", str(properties.resolutionMode)),
+                MacroParameter("minResolution", str(properties.minResolution)),
+                MacroParameter("incrementalColumn", str(properties.incrementalColumn)),
+                MacroParameter("outputGeometry", str(properties.outputGeometry)),
+                MacroParameter("outputCellId", str(properties.outputCellId).lower()),
+                MacroParameter("outputCentroid", str(properties.outputCentroid).lower()),
+                MacroParameter("kernelBandwidth", str(properties.kernelBandwidth)),
+                MacroParameter("ringWeights", str(properties.ringWeights))
             ],
         )
 
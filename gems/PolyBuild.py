@@ -29,6 +29,11 @@ class PolyBuild(MacroSpec):
         latitudeColumnName: str = ""
         groupColumnName: str = ""
         sequenceColumnName: str = ""
+        assemblyMode: str = "collect"
+        chunkSize: int = 10000
+        maxVertices: int = 0
+        thinningMethod: str = "none"
+        thinningTolerance: float = 0
 
     def get_relation_names(self, component: Component, context: SqlContext):
         all_upstream_nodes = []
@@ -111,10 +116,70 @@ class PolyBuild(MacroSpec):
                                         .addColumn()
                                         .addColumn()
                                     )
+                                    .addElement(
+                                        ColumnsLayout(gap="1rem", height="100%")
+                                        .addColumn(
+                                            SelectBox("Assembly")
+                                            .addOption("In Memory (one array per group)", "collect")
+                                            .addOption("Chunked (very large groups)", "chunked")
+                                            .bindProperty("assemblyMode")
+                                        )
+                                        .addColumn(
+                                            Condition()
+                                            .ifEqual(
+                                                PropExpr("component.properties.assemblyMode"),
+                                                StringExpr("chunked"),
+                                            )
+                                            .then(
+                                                NumberBox("Vertices per Chunk", placeholder="10000", minValueVar=1)
+                                                .bindProperty("chunkSize")
+                                            )
+                                        )
+                                        .addColumn(
+                                            Condition()
+                                            .ifEqual(
+                                                PropExpr("component.properties.assemblyMode"),
+                                                StringExpr("chunked"),
+                                            )
+                                            .then(
+                                                NumberBox("Max Vertices per Polyline (0 for no split)", placeholder="0", minValueVar=0)
+                                                .bindProperty("maxVertices")
+                                            )
+                                        )
+                                        .addColumn()
+                                    )
+                                    .addElement(
+                                        ColumnsLayout(gap="1rem", height="100%")
+                                        .addColumn(
+                                            SelectBox("Thinning")
+                                            .addOption("None", "none")
+                                            .addOption("Grid Snapping", "distance")
+                                            .addOption("Douglas-Peucker", "douglaspeucker")
+                                            .bindProperty("thinningMethod")
+                                        )
+                                        .addColumn(
+                                            NumberBox("Thinning Tolerance (meters)", placeholder="0", minValueVar=0)
+                                            .bindProperty("thinningTolerance")
+                                        )
+                                        .addColumn()
+                                        .addColumn()
+                                    )
                         )
                     )
 
                 )
+                .addElement(
+                    AlertBox(
+                        variant="success",
+                        _children=[
+                            Markdown(
+                                "**Chunked** assembly numbers the points of each group and builds the WKT in chunks, so groups with millions of points (or all rows, when no group is set) do not have to fit in memory as a single array. "
+                                "**Max Vertices per Polyline** splits long tracks into consecutive segments that share their end points; the output then has a `segment_index` column.\n\n"
+                                "**Thinning** drops points before the WKT is built, so a separate Simplify step is not needed. **Grid Snapping** lays a grid of tolerance-sized cells over the points and keeps the first of each run of consecutive points in the same cell (the first and last points are always kept), so every dropped point lies within about 1.5 × the tolerance of a kept one. **Douglas-Peucker** simplifies the assembled shape with the given tolerance and requires the in-memory assembly."
+                            )
+                        ]
+                    )
+                )
             )
         )
         return dialog
@@ -157,6 +222,26 @@ class PolyBuild(MacroSpec):
                     Diagnostic("component.properties.sequenceColumnName", f"Selected sequence column {component.properties.sequenceColumnName} is not present in input schema.", SeverityLevelEnum.Error)
                 )
 
+        if component.properties.assemblyMode == "chunked" and component.properties.maxVertices != 0:
+            if component.properties.buildMethod == "SequencePolygon":
+                diagnostics.append(
+                    Diagnostic("component.properties.maxVertices", "Polygons can not be split, please set Max Vertices to 0 or build polylines.", SeverityLevelEnum.Error)
+                )
+            elif component.properties.maxVertices < 2:
+                diagnostics.append(
+                    Diagnostic("component.properties.maxVertices", "Max Vertices must be at least 2.", SeverityLevelEnum.Error)
+                )
+
+
+        if component.properties.thinningMethod != "none" and component.properties.thinningTolerance <= 0:
+            diagnostics.append(
+                Diagnostic("component.properties.thinningTolerance", "Please enter a thinning tolerance greater than 0.", SeverityLevelEnum.Error)
+            )
+
+        if component.properties.thinningMethod == "douglaspeucker" and component.properties.assemblyMode == "chunked":
+            diagnostics.append(
+                Diagnostic("component.properties.thinningMethod", "Douglas-Peucker thinning is not available with chunked assembly.", SeverityLevelEnum.Error)
+            )
 
         return diagnostics
 
@@ -183,7 +268,12 @@ class PolyBuild(MacroSpec):
             "'" + props.longitudeColumnName + "'",
             "'" + props.latitudeColumnName + "'",
             "'" + props.groupColumnName + "'",
-            "'" + props.sequenceColumnName + "'"
+            "'" + props.sequenceColumnName + "'",
+            "'" + props.assemblyMode + "'",
+            str(props.chunkSize),
+            str(props.maxVertices),
+            "'" + props.thinningMethod + "'",
+            str(props.thinningTolerance)
         ]
         params = ",".join([param for param in arguments])
         return f'{{{{ {resolved_macro_name}({params}) }}}}'
@@ -198,7 +288,12 @@ class PolyBuild(MacroSpec):
             longitudeColumnName=parametersMap.get('longitudeColumnName'),
             latitudeColumnName=parametersMap.get('latitudeColumnName'),
             groupColumnName=parametersMap.get('groupColumnName'),
-            sequenceColumnName=parametersMap.get('sequenceColumnName')
+            sequenceColumnName=parametersMap.get('sequenceColumnName'),
+            assemblyMode=parametersMap.get('assemblyMode', 'collect'),
+            chunkSize=int(parametersMap.get('chunkSize', '10000')),
+            maxVertices=int(parametersMap.get('maxVertices', '0')),
+            thinningMethod=parametersMap.get('thinningMethod', 'none'),
+            thinningTolerance=float(parametersMap.get('thinningTolerance', '0'))
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -212,7 +307,12 @@ class PolyBuild(MacroSpec):
                 MacroParameter("longitudeColumnName", properties.longitudeColumnName),
                 MacroParameter("latitudeColumnName", properties.latitudeColumnName),
                 MacroParameter("groupColumnName", properties.groupColumnName),
-                MacroParameter("sequenceColumnName", properties.sequenceColumnName)
+                MacroParameter("sequenceColumnName", properties.sequenceColumnName),
+                MacroParameter("assemblyMode", str(properties.assemblyMode)),
+                MacroParameter("chunkSize", str(properties.chunkSize)),
+                MacroParameter("maxVertices", str(properties.maxVertices)),
+                MacroParameter("thinningMethod", str(properties.thinningMethod)),
+                MacroParameter("thinningTolerance", str(properties.thinningTolerance))
             ],
         )
 
@@ -29,6 +29,21 @@ class SpatialMatch(MacroSpec):
         source_column:str = ""
         target_column:str = ""
         match_type: str = ""
+        match_method: str = "crossjoin"
+        h3_resolution: int = 7
+        range_join_bin_size: float = 0
+        output_mode: str = "all"
+        source_output_columns: List[str] = field(default_factory=list)
+        target_output_columns: List[str] = field(default_factory=list)
+        source_key_column: str = ""
+        target_key_column: str = ""
+        match_cardinality: str = "all"
+        priority_column: str = ""
+        priority_descending: bool = False
+        source_format: str = "auto"
+        target_format: str = "auto"
+        source_detected_format: str = "wkt"
+        target_detected_format: str = "wkt"
 
 
     def get_relation_names(self, component: Component, context: SqlContext):
@@ -51,7 +66,7 @@ class SpatialMatch(MacroSpec):
         return relation_name
         
     def extract_schemas(self, component: Component):
-        """Return list[str] one compact JSON blob per input port."""
+        # column names of each input port, in input order
         schemas = []
         for inputPort in component.ports.inputs:
             raw_schema = json.loads(str(inputPort.schema).replace("'", '"'))
@@ -59,6 +74,19 @@ class SpatialMatch(MacroSpec):
             schemas.append(fields_arr)
         return schemas
 
+    def column_type(self, component: Component, port: int, column_name: str) -> str:
+        # data type of a column on an input port, '' when unknown
+        if len(component.ports.inputs) <= port:
+            return ""
+        raw_schema = json.loads(str(component.ports.inputs[port].schema).replace("'", '"'))
+        data_types = {f["name"]: str(f["dataType"]["type"]).lower() for f in raw_schema["fields"]}
+        return data_types.get(column_name, "")
+
+    def detected_format(self, component: Component, port: int, column_name: str) -> str:
+        # format a "Detect from Column Type" selection resolves to; long columns are H3 cells
+        column_type = self.column_type(component, port, column_name)
+        return {"binary": "wkb", "struct": "struct", "long": "h3", "bigint": "h3"}.get(column_type, "wkt")
+
 
     def dialog(self) -> Dialog:
         dialog = Dialog("SpatialMatch") \
@@ -90,14 +118,38 @@ class SpatialMatch(MacroSpec):
                                     .addElement(
                                     ColumnsLayout(gap="1rem", height="100%")
                                         .addColumn(
-                                            SchemaColumnsDropdown("Source (smaller geometry - e.g. points or lines)")
-                                        .bindSchema("component.ports.inputs[0].schema")
-                                        .bindProperty("source_column")
+                                            StackLayout()
+                                            .addElement(
+                                                SchemaColumnsDropdown("Source (smaller geometry - e.g. points or lines)")
+                                                .bindSchema("component.ports.inputs[0].schema")
+                                                .bindProperty("source_column")
+                                            )
+                                            .addElement(
+                                                SelectBox("Source Format")
+                                                .addOption("Detect from Column Type", "auto")
+                                                .addOption("WKT", "wkt")
+                                                .addOption("WKB", "wkb")
+                                                .addOption("Point Struct (lon, lat)", "struct")
+                                                .addOption("H3 Cell", "h3")
+                                                .bindProperty("source_format")
+                                            )
                                     )
                                         .addColumn(
-                                            SchemaColumnsDropdown("Target (larger shapes - e.g. polygons)")
-                                        .bindSchema("component.ports.inputs[1].schema")
-                                        .bindProperty("target_column")
+                                            StackLayout()
+                                            .addElement(
+                                                SchemaColumnsDropdown("Target (larger shapes - e.g. polygons)")
+                                                .bindSchema("component.ports.inputs[1].schema")
+                                                .bindProperty("target_column")
+                                            )
+                                            .addElement(
+                                                SelectBox("Target Format")
+                                                .addOption("Detect from Column Type", "auto")
+                                                .addOption("WKT", "wkt")
+                                                .addOption("WKB", "wkb")
+                                                .addOption("Point Struct (lon, lat)", "struct")
+                                                .addOption("H3 Cell", "h3")
+                                                .bindProperty("target_format")
+                                            )
                                     )
                                 )
                             )
@@ -121,6 +173,124 @@ class SpatialMatch(MacroSpec):
                                             .addOption("Source Envelope Intersects Target Envelope", "envelope")
                                             .bindProperty("match_type")
                                         )
+                                        .addElement(
+                                            ColumnsLayout(gap="1rem", height="100%")
+                                            .addColumn(
+                                                SelectBox("Match Method")
+                                                .addOption("Compare Every Pair", "crossjoin")
+                                                .addOption("H3 Index", "h3index")
+                                                .bindProperty("match_method")
+                                            )
+                                            .addColumn(
+                                                Condition()
+                                                .ifEqual(
+                                                    PropExpr("component.properties.match_method"),
+                                                    StringExpr("h3index"),
+                                                )
+                                                .then(
+                                                    NumberBox("H3 Resolution", placeholder="7", minValueVar=0, maxValueVar=15)
+                                                    .bindProperty("h3_resolution")
+                                                )
+                                            )
+                                        )
+                                        .addElement(
+                                            ColumnsLayout(gap="1rem", height="100%")
+                                            .addColumn(
+                                                Condition()
+                                                .ifEqual(
+                                                    PropExpr("component.properties.match_method"),
+                                                    StringExpr("crossjoin"),
+                                                )
+                                                .then(
+                                                    NumberBox("Range Join Bin Size in degrees (0 to disable)", placeholder="0", minValueVar=0)
+                                                    .bindProperty("range_join_bin_size")
+                                                )
+                                            )
+                                            .addColumn()
+                                        )
+                                    )
+                                )
+                                .addElement(
+                                    Step()
+                                    .addElement(
+                                        StackLayout(height="auto")
+                                        .addElement(
+                                            SelectBox("Matches per Source Row")
+                                            .addOption("All Matches", "all")
+                                            .addOption("Any Match (source rows with at least one match)", "any")
+                                            .addOption("First Match by Priority", "first")
+                                            .addOption("Match Count", "count")
+                                            .bindProperty("match_cardinality")
+                                        )
+                                        .addElement(
+                                            Condition()
+                                            .ifEqual(
+                                                PropExpr("component.properties.match_cardinality"),
+                                                StringExpr("first"),
+                                            )
+                                            .then(
+                                                ColumnsLayout(gap="1rem", height="100%")
+                                                .addColumn(
+                                                    SchemaColumnsDropdown("Target Priority Column (optional)")
+                                                    .bindSchema("component.ports.inputs[1].schema")
+                                                    .bindProperty("priority_column")
+                                                )
+                                                .addColumn(
+                                                    Checkbox("Highest Priority Value Wins").bindProperty("priority_descending")
+                                                )
+                                            )
+                                        )
+                                    )
+                                )
+                                .addElement(
+                                    Step()
+                                    .addElement(
+                                        StackLayout(height="auto")
+                                        .addElement(
+                                            TitleElement("Output Columns")
+                                        )
+                                        .addElement(
+                                            SelectBox("Output")
+                                            .addOption("All Source and Target Columns", "all")
+                                            .addOption("Selected Columns", "selected")
+                                            .addOption("Key Columns Only", "ids")
+                                            .bindProperty("output_mode")
+                                        )
+                                        .addElement(
+                                            Condition()
+                                            .ifEqual(
+                                                PropExpr("component.properties.output_mode"),
+                                                StringExpr("selected"),
+                                            )
+                                            .then(
+                                                ColumnsLayout(gap="1rem", height="100%")
+                                                .addColumn(
+                                                    SchemaColumnsDropdown("Source Columns to Keep")
+                                                    .withMultipleSelection()
+                                                    .bindSchema("component.ports.inputs[0].schema")
+                                                    .bindProperty("source_output_columns")
+                                                )
+                                                .addColumn(
+                                                    SchemaColumnsDropdown("Target Columns to Keep")
+                                                    .withMultipleSelection()
+                                                    .bindSchema("component.ports.inputs[1].schema")
+                                                    .bindProperty("target_output_columns")
+                                                )
+                                            )
+                                        )
+                                        .addElement(
+                                            ColumnsLayout(gap="1rem", height="100%")
+                                            .addColumn(
+                                                SchemaColumnsDropdown("Source Key Column (unique per row)")
+                                                .bindSchema("component.ports.inputs[0].schema")
+                                                .bindProperty("source_key_column")
+                                            )
+                                            .addColumn(
+                                                SchemaColumnsDropdown("Target Key Column (unique per row)")
+                                                .bindSchema("component.ports.inputs[1].schema")
+                                                .bindProperty("target_key_column")
+                                            )
+                                        )
                                     )
                                 )
                             )
@@ -143,8 +313,12 @@ class SpatialMatch(MacroSpec):
                                 variant="success",
                                 _children=[
                                     Markdown(
-                                        "This gem requires that the Source column and Destination column contain geometric values in Well-Known Text (WKT) format. To convert longitude and latitude coordinates into WKT format, use the [CreatePoint gem](https://docs.prophecy.io/analysts/create-point/) for points and the [PolyBuild gem](https://docs.prophecy.io/analysts/polybuild/) for polygons and lines.\n\n"
-                                        "Example: If your table has columns like `source_longitude`, `source_latitude`, `target_longitude`, and `target_latitude`, first use the CreatePoint Gem to generate `source_geopoint` and `target_geopoint` columns in WKT format."
+                                        "This gem requires that the Source column and Destination column contain geometric values in Well-Known Text (WKT) format. To convert longitude and latitude coordinates into WKT format, use the [CreatePoint gem](https://docs.prophecy.io/analysts/create-point/) for points and the [PolyBuild gem](https://docs.prophecy.io/analysts/polybuild/) for polygons and lines. Points that CreatePoint writes as WKB, a struct or an H3 cell id can be read directly: pick the format, or let **Detect from Column Type** tell it from the column's data type (binary is WKB, struct a point struct and long an H3 cell id).\n\n"
+                                        "Example: If your table has columns like `source_longitude`, `source_latitude`, `target_longitude`, and `target_latitude`, first use the CreatePoint Gem to generate `source_geopoint` and `target_geopoint` columns in WKT format.\n\n"
+                                        "**H3 Index** covers points, lines and polygons with H3 cells and only tests pairs that share a cell. Pick a resolution whose cells are somewhat smaller than the target shapes.\n\n"
+                                        "Every match type first compares bounding boxes, and only overlapping pairs run the exact spatial test. A **Range Join Bin Size** close to the typical width of the target shapes (in degrees) lets Databricks bin that comparison instead of checking every pair.\n\n"
+                                        "With a key column only row keys and geometries go through the spatial join, and the output columns are joined back afterwards; **Key Columns Only** returns just the source and target keys and skips that step entirely. Without a key column that side's output columns go through the join in a single pass.\n\n"
+                                        "**Any Match**, **Match Count** and **First Match by Priority** need a source key column, and First Match by Priority a target key column as well. **Any Match** returns one row per matched source row and **Match Count** one row per source row, with a count of 0 when nothing matches; neither returns target columns or builds the full list of matching pairs. **First Match by Priority** keeps the matching target with the lowest priority value, or the highest when descending; empty values come last and ties go to the lowest target key."
                                     )
                                 ]
                             )
@@ -186,6 +360,73 @@ class SpatialMatch(MacroSpec):
                                f"Selected column {component.properties.target_column} is not present in input schema.",
                                SeverityLevelEnum.Error))
 
+        for key_property, key_column, field_names in [
+            ("source_key_column", component.properties.source_key_column, source_field_names),
+            ("target_key_column", component.properties.target_key_column, target_field_names),
+        ]:
+            needs_key = key_property == "source_key_column" or component.properties.match_cardinality in ["all", "first"]
+            # matches are collapsed per source key; 'first' also breaks ties on the target key
+            cardinality_needs_key = component.properties.match_cardinality == "first" \
+                or (key_property == "source_key_column" and component.properties.match_cardinality != "all")
+            if cardinality_needs_key and len(key_column) == 0:
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{key_property}",
+                               "Please select a key column, this match cardinality needs one to tell rows apart",
+                               SeverityLevelEnum.Error))
+            elif component.properties.output_mode == "ids" and needs_key and len(key_column) == 0:
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{key_property}",
+                               "Please select a key column to output only keys",
+                               SeverityLevelEnum.Error))
+            elif len(key_column) > 0 and key_column not in field_names:
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{key_property}",
+                               f"Selected column {key_column} is not present in input schema.",
+                               SeverityLevelEnum.Error))
+
+        for column_property, format_property, port in [("source_column", "source_format", 0), ("target_column", "target_format", 1)]:
+            column_name = getattr(component.properties, column_property)
+            geometry_format = getattr(component.properties, format_property)
+            column_type = self.column_type(component, port, column_name)
+            if geometry_format in ["auto", "wkt"] and column_type.startswith(("double", "float", "integer", "short", "byte", "decimal")):
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{column_property}",
+                               f"Selected column {column_name} is numeric; please select a geometry (WKT or WKB), point struct or H3 cell column.",
+                               SeverityLevelEnum.Error))
+            elif geometry_format == "auto" and column_type in ["long", "bigint"]:
+                diagnostics.append(
+                    Diagnostic(f"component.properties.{format_property}",
+                               f"Column {column_name} is a long and is matched as an H3 cell id; choose H3 Cell as its format to confirm.",
+                               SeverityLevelEnum.Warning))
+
+        if component.properties.match_cardinality == "first" and len(component.properties.priority_column) > 0:
+            if component.properties.priority_column not in target_field_names:
+                diagnostics.append(
+                    Diagnostic("component.properties.priority_column",
+                               f"Selected column {component.properties.priority_column} is not present in input schema.",
+                               SeverityLevelEnum.Error))
+
+        if component.properties.output_mode == "selected":
+            for output_property, output_columns, field_names in [
+                ("source_output_columns", component.properties.source_output_columns, source_field_names),
+                ("target_output_columns", component.properties.target_output_columns, target_field_names),
+            ]:
+                missing = [col for col in output_columns if col not in field_names]
+                if len(missing) > 0:
+                    diagnostics.append(
+                        Diagnostic(f"component.properties.{output_property}",
+                                   f"Selected columns {', '.join(missing)} are not present in input schema.",
+                                   SeverityLevelEnum.Error))
+
+            # 'any' and 'count' drop target columns; 'count' always adds match_count
+            keeps_target = component.properties.match_cardinality in ["all", "first"]
+            if component.properties.match_cardinality != "count" \
+                    and len(component.properties.source_output_columns) == 0 \
+                    and (not keeps_target or len(component.properties.target_output_columns) == 0):
+                diagnostics.append(
+                    Diagnostic("component.properties.source_output_columns",
+                               "Please select at least one output column",
+                               SeverityLevelEnum.Error))
 
         return diagnostics
 
@@ -196,19 +437,43 @@ class SpatialMatch(MacroSpec):
         newProperties = dataclasses.replace(
             newState.properties,
             relation_name=relation_name,
-            schemas=self.extract_schemas(newState)
+            schemas=self.extract_schemas(newState),
+            source_detected_format=self.detected_format(newState, 0, newState.properties.source_column),
+            target_detected_format=self.detected_format(newState, 1, newState.properties.target_column)
         )
         return newState.bindProperties(newProperties)
 
+    def output_schemas(self, props: SpatialMatchProperties) -> List[List[str]]:
+        # columns each side contributes to the output, in input order
+        if props.output_mode == "ids":
+            return [[props.source_key_column], [props.target_key_column]]
+        if props.output_mode == "selected":
+            return [
+                [col for col in props.schemas[0] if col in props.source_output_columns],
+                [col for col in props.schemas[1] if col in props.target_output_columns],
+            ]
+        return props.schemas
+
     def apply(self, props: SpatialMatchProperties) -> str:
         # generate the actual macro call given the component's state
         resolved_macro_name = f"{self.projectName}.{self.name}"
+        source_format = props.source_detected_format if props.source_format == "auto" else props.source_format
+        target_format = props.target_detected_format if props.target_format == "auto" else props.target_format
         arguments = [
             str(props.relation_name),
-            str(props.schemas),
+            str(self.output_schemas(props)),
             "'" + props.source_column + "'",
             "'" + props.target_column + "'",
-            "'" + props.match_type + "'"
+            "'" + props.match_type + "'",
+            "'" + props.match_method + "'",
+            str(props.h3_resolution),
+            str(props.range_join_bin_size),
+            str([props.source_key_column, props.target_key_column]),
+            "'" + props.match_cardinality + "'",
+            "'" + props.priority_column + "'",
+            str(props.priority_descending).lower(),
+            "'" + source_format + "'",
+            "'" + target_format + "'"
         ]
         params = ",".join([param for param in arguments])
         return f'{{{{ {resolved_macro_name}({params}) }}}}'
@@ -219,10 +484,25 @@ class SpatialMatch(MacroSpec):
         parametersMap = self.convertToParameterMap(properties.parameters)
         return SpatialMatch.SpatialMatchProperties(
             relation_name=parametersMap.get('relation_name'),
-            schemas=parametersMap.get("schemas"),
+            schemas=json.loads(parametersMap.get("schemas", "[]").replace("'", '"')),
             match_type=parametersMap.get('match_type'),
             source_column=parametersMap.get('source_column'),
-            target_column=parametersMap.get('target_column')                          
+            target_column=parametersMap.get('target_column'),
+            match_method=parametersMap.get('match_method', 'crossjoin'),
+            h3_resolution=int(parametersMap.get('h3_resolution', '7')),
+            range_join_bin_size=float(parametersMap.get('range_join_bin_size', '0')),
+            output_mode=parametersMap.get('output_mode', 'all'),
+            source_output_columns=json.loads(parametersMap.get('source_output_columns', '[]')),
+            target_output_columns=json.loads(parametersMap.get('target_output_columns', '[]')),
+            source_key_column=parametersMap.get('source_key_column', ''),
+            target_key_column=parametersMap.get('target_key_column', ''),
+            match_cardinality=parametersMap.get('match_cardinality', 'all'),
+            priority_column=parametersMap.get('priority_column', ''),
+            priority_descending=parametersMap.get('priority_descending', 'false').lower() == 'true',
+            source_format=parametersMap.get('source_format', 'auto'),
+            target_format=parametersMap.get('target_format', 'auto'),
+            source_detected_format=parametersMap.get('source_detected_format', 'wkt'),
+            target_detected_format=parametersMap.get('target_detected_format', 'wkt')
         )
 
     def unloadProperties(self, properties: PropertiesType) -> MacroProperties:
@@ -232,10 +512,25 @@ class SpatialMatch(MacroSpec):
             projectName=self.projectName,
             parameters=[
                 MacroParameter("relation_name", str(properties.relation_name)),
-                MacroParameter("schemas",       str(properties.schemas)),
+                MacroParameter("schemas",       json.dumps(properties.schemas)),
                 MacroParameter("match_type", str(properties.match_type)),
                 MacroParameter("source_column", str(properties.source_column)),
-                MacroParameter("target_column", str(properties.target_column))                                
+                MacroParameter("target_column", str(properties.target_column)),
+                MacroParameter("match_method", str(properties.match_method)),
+                MacroParameter("h3_resolution", str(properties.h3_resolution)),
+                MacroParameter("range_join_bin_size", str(properties.range_join_bin_size)),
+                MacroParameter("output_mode", str(properties.output_mode)),
+                MacroParameter("source_output_columns", json.dumps(properties.source_output_columns)),
+                MacroParameter("target_output_columns", json.dumps(properties.target_output_columns)),
+                MacroParameter("source_key_column", str(properties.source_key_column)),
+                MacroParameter("target_key_column", str(properties.target_key_column)),
+                MacroParameter("match_cardinality", str(properties.match_cardinality)),
+                MacroParameter("priority_column", str(properties.priority_column)),
+                MacroParameter("priority_descending", str(properties.priority_descending).lower()),
+                MacroParameter("source_format", properties.source_format),
+                MacroParameter("target_format", properties.target_format),
+                MacroParameter("source_detected_format", properties.source_detected_format),
+                MacroParameter("target_detected_format", properties.target_detected_format)
             ],
         )
 
@@ -246,6 +541,8 @@ class SpatialMatch(MacroSpec):
         newProperties = dataclasses.replace(
             component.properties,
             relation_name=relation_name,
-            schemas=self._extract_schemas(newState)
+            schemas=self.extract_schemas(component),
+            source_detected_format=self.detected_format(component, 0, component.properties.source_column),
+            target_detected_format=self.detected_format(component, 1, component.properties.target_column)
         )
         return component.bindProperties(newProperties)
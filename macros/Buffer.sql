@@ -1,10 +1,10 @@
-{% macro Buffer(table_name, schema, geom_column_name, distance, unit) -%}
-    {{ return(adapter.dispatch('Buffer', 'prophecy_spatial')(table_name, schema, geom_column_name, distance, unit)) }}
+{% macro Buffer(table_name, schema, geom_column_name, distance, unit, geomFormat='wkt') -%}
+    {{ return(adapter.dispatch('Buffer', 'prophecy_spatial')(table_name, schema, geom_column_name, distance, unit, geomFormat)) }}
 {% endmacro %}
 
 
 {%- macro default__Buffer(
-        table_name, schema, geom_column_name, distance, unit
+        table_name, schema, geom_column_name, distance, unit, geomFormat='wkt'
 ) -%}
   {{ log("table_name=" ~ table_name, info=True) }}
   {{ log("schema=" ~ schema, info=True) }}
@@ -24,7 +24,7 @@
       ST_Transform(
         ST_Buffer(
           ST_Transform(
-            ST_GeomFromText({{geom_column_name}}, 4326),
+            {{ _geo_geometry(geomFormat, geom_column_name, 4326) }},
             3857
           ),
           {{distance_meters}}
@@ -1,10 +1,10 @@
-{% macro CreatePoint(relation, matchFields) -%}
-    {{ return(adapter.dispatch('CreatePoint', 'prophecy_spatial')(relation, matchFields)) }}
+{% macro CreatePoint(relation, matchFields, outputFormat='wkt', h3Resolution=7) -%}
+    {{ return(adapter.dispatch('CreatePoint', 'prophecy_spatial')(relation, matchFields, outputFormat, h3Resolution)) }}
 {% endmacro %}
 
 
 {%- macro default__CreatePoint(
-        relation, matchFields
+        relation, matchFields, outputFormat='wkt', h3Resolution=7
 ) -%}
     {%- set invalid_fields = [] -%}
     {%- for fields in matchFields %}
@@ -13,14 +13,19 @@
         {%- endif %}
     {%- endfor %}
 
+    {#
+        outputFormat: 'wkt' text (the default), 'wkb' binary, 'struct' as
+        struct<lon: double, lat: double> or 'h3' cell id at h3Resolution. The
+        non-text formats are read by the other gems without any string parsing.
+    #}
     {%- if matchFields | length == 0 or invalid_fields | length > 0 %}
         select * from `{{ relation }}`
     {%- else %}
         select
             *,
             {%- for fields in matchFields %}
-                CONCAT('POINT (', `{{ fields[0] }}`, ' ', `{{ fields[1] }}`, ')') as `{{ fields[2] }}`{% if not loop.last %},{% endif %}
+                {{ _geo_point_value(outputFormat, fields[0], fields[1], h3Resolution) }} as `{{ fields[2] }}`{% if not loop.last %},{% endif %}
             {%- endfor %}
         from `{{ relation }}`
     {%- endif %}
-{%- endmacro -%}
\ No newline at end of file
+{%- endmacro -%}
@@ -7,7 +7,15 @@
     units,
     outputCardDirection,
     outputDirectionDegrees,
-    allColumnNames=[]) -%}
+    allColumnNames=[],
+    sourceLatColumnName='',
+    destinationLatColumnName='',
+    matrixRelationName='',
+    destinationAllColumnNames=[],
+    maxDistance=0,
+    sourceGroupColumnName='',
+    destinationGroupColumnName='',
+    formula='haversine') -%}
     {{ return(adapter.dispatch('Distance', 'prophecy_spatial')(relation_name,
     sourceColumnNames,
     destinationColumnNames,
@@ -17,7 +25,15 @@
     units,
     outputCardDirection,
     outputDirectionDegrees,
-    allColumnNames)) }}
+    allColumnNames,
+    sourceLatColumnName,
+    destinationLatColumnName,
+    matrixRelationName,
+    destinationAllColumnNames,
+    maxDistance,
+    sourceGroupColumnName,
+    destinationGroupColumnName,
+    formula)) }}
 {% endmacro %}
 
 
@@ -31,103 +47,172 @@
     units,
     outputCardDirection,
     outputDirectionDegrees,
-    allColumnNames=[]
+    allColumnNames=[],
+    sourceLatColumnName='',
+    destinationLatColumnName='',
+    matrixRelationName='',
+    destinationAllColumnNames=[],
+    maxDistance=0,
+    sourceGroupColumnName='',
+    destinationGroupColumnName='',
+    formula='haversine'
 ) -%}
+  {#
+    Matrix mode: destinations come from a second relation and the output is one
+    row per (source, destination) pair in long format, destination columns
+    prefixed with target_. Pairs can be limited to the same group and to
+    maxDistance, so only the pairs that are kept are ever built.
+  #}
+  {%- set matrix = matrixRelationName | trim | length > 0 -%}
+  {%- set grouped = matrix and sourceGroupColumnName | length > 0 and destinationGroupColumnName | length > 0 -%}
+  {%- set cutoff = matrix and maxDistance | float > 0 -%}
+
   {% set cols_str -%}
     {%- for col in allColumnNames -%}
       `{{ col }}`{{ "," if not loop.last }}
     {%- endfor -%}
+    {%- if matrix -%}
+      {%- for col in destinationAllColumnNames -%}
+        ,`target_{{ col }}`
+      {%- endfor -%}
+    {%- endif -%}
   {%- endset %}
 
-  {%- if sourceType == 'point'
-        and destinationType == 'point'
+  {#
+    Point inputs: 'point' is WKT text, 'lonlat' two numeric columns (the column
+    name plus sourceLatColumnName / destinationLatColumnName), 'struct' a
+    struct<lon, lat>, 'wkb' a WKB point and 'h3' a cell id (its centre); only
+    WKT needs string parsing.
+  #}
+  {%- set point_types = ['point', 'lonlat', 'struct', 'wkb', 'h3'] -%}
+
+  {%- if sourceType in point_types
+        and destinationType in point_types
         and (outputDistance or outputCardDirection or outputDirectionDegrees)
   -%}
 
     {#–– radius & distance alias ––#}
-    {%- if units == 'kms' -%}
-      {%- set distance_col = 'distanceKilometers' -%}
-      {%- set radius        = 6371 -%}
-    {%- elif units == 'mls' -%}
-      {%- set distance_col = 'distanceMiles' -%}
-      {%- set radius        = 3958.8 -%}
-    {%- elif units == 'mtr' -%}
-      {%- set distance_col = 'distanceMeters' -%}
-      {%- set radius        = 6371000 -%}
-    {%- elif units == 'feet' -%}
-      {%- set distance_col = 'distanceFeet' -%}
-      {%- set radius        = 6371000 * 3.28084 -%}
-    {%- else -%}
-      {%- set distance_col = 'distance' -%}
-      {%- set radius        = 6371 -%}
-    {%- endif -%}
+    {%- set unit_info    = _geo_units(units) -%}
+    {%- set distance_col = unit_info['distance_col'] -%}
+    {%- set radius       = unit_info['radius'] -%}
 
     {%- set direction_col = 'cardinal_direction' -%}
     {%- set degrees_col   = 'direction_degrees'   -%}
     {%- set needs_bearing = outputCardDirection or outputDirectionDegrees -%}
 
+    {%- set distance_expr = _geo_distance_expr(formula, radius) -%}
+    {%- set distance_value = '_distance' if cutoff else distance_expr -%}
+
+    {#
+      cutoff prefilter: points within maxDistance are at most band_deg degrees of
+      latitude apart, so each source only meets destinations in its own latitude
+      band and the two next to it (an equi-join instead of a cross product).
+      Within those bands the longitude is bounded as in FindNearest: at most
+      asin(sin(d / R) / cos(lat)) degrees either way, wrapping at the antimeridian,
+      and unbounded when the band reaches a pole. Both are sized on the sphere,
+      widened for formulas that can be shorter.
+    #}
+    {%- set search_distance = (maxDistance | float) / _geo_formula_sphere_ratio(formula) if cutoff else 0 -%}
+    {%- set band_deg = search_distance / radius * 57.29577951308232 -%}
+
+    {% if matrix %}
+    WITH _src AS (
+      SELECT
+        {%- for col in allColumnNames %}
+        `{{ col }}`,
+        {%- endfor %}
+        {%- if grouped %}
+        `{{ sourceGroupColumnName }}` AS _group_key,
+        {%- endif %}
+        {{ _geo_point_coords(sourceType, sourceColumnNames, sourceLatColumnName, 'lon1', 'lat1') }}
+      FROM `{{ relation_name }}`
+    ),
+    _dst AS (
+      SELECT
+        {%- for col in destinationAllColumnNames %}
+        `{{ col }}` AS `target_{{ col }}`,
+        {%- endfor %}
+        {%- if grouped %}
+        `{{ destinationGroupColumnName }}` AS _group_key,
+        {%- endif %}
+        {{ _geo_point_coords(destinationType, destinationColumnNames, destinationLatColumnName, 'lon2', 'lat2') }}
+      FROM `{{ matrixRelationName }}`
+    ),
+    _coords AS (
+      {%- if cutoff %}
+      {#— the distance is computed once per candidate pair, then filtered on and selected —#}
+      SELECT *
+      FROM (
+      {%- endif %}
+      SELECT
+        {{ cols_str }},
+        lon1,
+        lat1,
+        lon2,
+        lat2{% if cutoff %},
+        {{ distance_expr }} AS _distance{% endif %}
+      {%- if grouped or cutoff %}
+      FROM (
+        SELECT
+          *{% if cutoff %},
+          CASE
+            WHEN ABS(lat1) + {{ band_deg }} >= 90 THEN NULL
+            ELSE DEGREES(ASIN(SIN({{ search_distance / radius }}) / COS(RADIANS(lat1)))) + 0.000000001
+          END AS _delta_lon,
+          EXPLODE(ARRAY(
+            FLOOR(lat1 / {{ band_deg }}) - 1,
+            FLOOR(lat1 / {{ band_deg }}),
+            FLOOR(lat1 / {{ band_deg }}) + 1
+          )) AS _band{% endif %}
+        FROM _src
+      ) AS s
+      JOIN (
+        SELECT
+          *{% if cutoff %},
+          FLOOR(lat2 / {{ band_deg }}) AS _band{% endif %}
+        FROM _dst
+      ) AS d
+        ON {% if grouped %}s._group_key = d._group_key{% endif %}
+        {%- if grouped and cutoff %}
+        AND {% endif %}{% if cutoff %}s._band = d._band
+        AND (
+          s._delta_lon IS NULL
+          OR ABS(d.lon2 - s.lon1) <= s._delta_lon
+          OR ABS(d.lon2 - s.lon1) >= 360 - s._delta_lon
+        ){% endif %}
+      {%- else %}
+      FROM _src AS s
+      CROSS JOIN _dst AS d
+      {%- endif %}
+      {%- if cutoff %}
+      )
+      WHERE _distance <= {{ maxDistance }}
+      {%- endif %}
+    )
+    {% else %}
     WITH _coords AS (
       SELECT
         {{ cols_str }},
-        CAST(
-          substring_index(substring_index(`{{ sourceColumnNames }}`, '(', -1), ' ', 1)
-        AS DOUBLE) AS lon1,
-        CAST(
-          substring_index(
-            substring_index(substring_index(`{{ sourceColumnNames }}`, '(', -1), ')', 1),
-          ' ', -1)
-        AS DOUBLE) AS lat1,
-        CAST(
-          substring_index(substring_index(`{{ destinationColumnNames }}`, '(', -1), ' ', 1)
-        AS DOUBLE) AS lon2,
-        CAST(
-          substring_index(
-            substring_index(substring_index(`{{ destinationColumnNames }}`, '(', -1), ')', 1),
-          ' ', -1)
-        AS DOUBLE) AS lat2
+        {{ _geo_point_coords(sourceType, sourceColumnNames, sourceLatColumnName, 'lon1', 'lat1') }},
+        {{ _geo_point_coords(destinationType, destinationColumnNames, destinationLatColumnName, 'lon2', 'lat2') }}
       FROM `{{ relation_name }}`
     )
+    {% endif %}
 
     {%- if needs_bearing %}
     , _with_bearing AS (
       SELECT
         *,
-        MOD(
-          DEGREES(
-            ATAN2(
-              RADIANS(lon2 - lon1),
-              LN(
-                TAN(RADIANS(lat2)/2 + PI()/4)
-                / TAN(RADIANS(lat1)/2 + PI()/4)
-              )
-            )
-          ) + 360,
-          360
-        ) AS bearing_deg
+        {{ _geo_bearing_expr() }} AS bearing_deg
       FROM _coords
     )
 
     SELECT
       {{ cols_str }}
       {%- if outputDistance %},
-      {{ radius }} * 2 * ASIN(
-        SQRT(
-          POWER(SIN(RADIANS((lat2 - lat1) / 2)), 2)
-          + COS(RADIANS(lat1)) * COS(RADIANS(lat2))
-          * POWER(SIN(RADIANS((lon2 - lon1) / 2)), 2)
-        )
-      ) AS {{ distance_col }}{%- endif %}
+      {{ distance_value }} AS {{ distance_col }}{%- endif %}
       {%- if outputCardDirection %},
-      CASE
-        WHEN bearing_deg < 22.5 OR bearing_deg >= 337.5 THEN 'N'
-        WHEN bearing_deg < 67.5 THEN 'NE'
-        WHEN bearing_deg < 112.5 THEN 'E'
-        WHEN bearing_deg < 157.5 THEN 'SE'
-        WHEN bearing_deg < 202.5 THEN 'S'
-        WHEN bearing_deg < 247.5 THEN 'SW'
-        WHEN bearing_deg < 292.5 THEN 'W'
-        ELSE 'NW'
-      END AS {{ direction_col }}{%- endif %}
+      {{ _geo_cardinal_direction('bearing_deg') }} AS {{ direction_col }}{%- endif %}
       {%- if outputDirectionDegrees %},
       bearing_deg AS {{ degrees_col }}{%- endif %}
     FROM _with_bearing
@@ -137,13 +222,7 @@
       -- only distance requested
       SELECT
         {{ cols_str }},
-        {{ radius }} * 2 * ASIN(
-          SQRT(
-            POWER(SIN(RADIANS((lat2 - lat1) / 2)), 2)
-            + COS(RADIANS(lat1)) * COS(RADIANS(lat2))
-            * POWER(SIN(RADIANS((lon2 - lon1) / 2)), 2)
-          )
-        ) AS {{ distance_col }}
+        {{ distance_value }} AS {{ distance_col }}
       FROM _coords
 
     {%- endif %}
@@ -154,4 +233,4 @@
 
   {%- endif -%}
 
-{% endmacro %}
\ No newline at end of file
+{% endmacro %}
@@ -8,7 +8,15 @@
     units='kms',
     ignoreZeroDistance=false,
     allSourceColumnNames=[],
-    allTargetColumnNames=[]) -%}
+    allTargetColumnNames=[],
+    searchMethod='bruteforce',
+    searchResolution=7,
+    outputDirection=true,
+    sourceKeyColumn='',
+    rankMethod='window',
+    sortOutput=true,
+    joinStrategy='auto',
+    formula='haversine') -%}
     {{ return(adapter.dispatch('FindNearest', 'prophecy_spatial')(relation_names,
     sourceColumnName,
     destinationColumnName,
@@ -19,7 +27,15 @@
     units,
     ignoreZeroDistance,
     allSourceColumnNames,
-    allTargetColumnNames)) }}
+    allTargetColumnNames,
+    searchMethod,
+    searchResolution,
+    outputDirection,
+    sourceKeyColumn,
+    rankMethod,
+    sortOutput,
+    joinStrategy,
+    formula)) }}
 {% endmacro %}
 
 {% macro default__FindNearest(
@@ -33,7 +49,15 @@
     units='kms',
     ignoreZeroDistance=false,
     allSourceColumnNames=[],
-    allTargetColumnNames=[]
+    allTargetColumnNames=[],
+    searchMethod='bruteforce',
+    searchResolution=7,
+    outputDirection=true,
+    sourceKeyColumn='',
+    rankMethod='window',
+    sortOutput=true,
+    joinStrategy='auto',
+    formula='haversine'
 ) -%}
 
   {#— Validate required arguments —#}
@@ -45,22 +69,9 @@
   {%- endif %}
 
   {#— Determine radius & distance column name —#}
-  {%- if units == 'kms' -%}
-    {%- set radius = 6371 -%}
-    {%- set distance_col = 'distanceKilometers' -%}
-  {%- elif units == 'mls' -%}
-    {%- set radius = 3958.8 -%}
-    {%- set distance_col = 'distanceMiles' -%}
-  {%- elif units == 'mtr' -%}
-    {%- set radius = 6371000 -%}
-    {%- set distance_col = 'distanceMeters' -%}
-  {%- elif units == 'feet' -%}
-    {%- set radius = 6371000 * 3.28084 -%}
-    {%- set distance_col = 'distanceFeet' -%}
-  {%- else -%}
-    {%- set radius = 6371 -%}
-    {%- set distance_col = 'distance' -%}
-  {%- endif -%}
+  {%- set unit_info = _geo_units(units) -%}
+  {%- set radius = unit_info['radius'] -%}
+  {%- set distance_col = unit_info['distance_col'] -%}
 
   {#— Build SELECT-list for source columns, aliasing conflicts —#}
   {%- set src_select_list = [] -%}
@@ -90,89 +101,331 @@
   {%- set tgt_cols_no_alias_str = tgt_cols_no_alias | join(', ') -%}
   {%- set tgt_select_str = tgt_select_list | join(', ') -%}
 
-  {#— Proceed only if both are points and column names provided —#}
+  {#— Proceed only if both are points (WKT, WKB, struct or H3 cell) and column names provided —#}
+  {%- set point_types = ['point', 'wkb', 'struct', 'h3'] -%}
   {%- if
-        sourceType == 'point'
-    and destinationType == 'point'
+        sourceType in point_types
+    and destinationType in point_types
     and sourceColumnName   != ''
     and destinationColumnName != ''
   -%}
 
+    {#—
+      Search windows (bounding box, H3 rings) are sized on the sphere; they are
+      widened to search_distance for formulas that can come out shorter.
+    —#}
+    {%- set sphere_ratio = _geo_formula_sphere_ratio(formula) -%}
+    {%- set search_distance = maxDistance / sphere_ratio -%}
+
+    {#— H3 search: a k-ring sized from maxDistance, or growing rings when unbounded —#}
+    {%- set h3_ring = none -%}
+    {%- set ring_steps = [] -%}
+    {%- if searchMethod == 'h3index' -%}
+      {%- if maxDistance > 0 -%}
+        {%- set h3_ring = _FindNearest_h3_search_ring(search_distance * 6371 / radius) -%}
+      {%- else -%}
+        {%- set ring_steps = [3, 6, 12, 24] -%}
+        {%- set search_edge_km = _FindNearest_h3_edge_km(searchResolution) -%}
+      {%- endif -%}
+    {%- endif -%}
+
+    {#—
+      Join hints: s is always the source side and d the target side. Shuffling
+      an equi-join (H3 cells) hashes both sides; the cross / bounding-box joins
+      have no equi-key, so they replicate instead. 'auto' leaves it to Spark.
+    —#}
+    {%- set equi_join_hint = '' -%}
+    {%- set nested_join_hint = '' -%}
+    {%- if joinStrategy == 'broadcast_target' -%}
+      {%- set equi_join_hint = '/*+ BROADCAST(d) */' -%}
+      {%- set nested_join_hint = '/*+ BROADCAST(d) */' -%}
+    {%- elif joinStrategy == 'broadcast_source' -%}
+      {%- set equi_join_hint = '/*+ BROADCAST(s) */' -%}
+      {%- set nested_join_hint = '/*+ BROADCAST(s) */' -%}
+    {%- elif joinStrategy == 'shuffle' -%}
+      {%- set equi_join_hint = '/*+ SHUFFLE_HASH(s, d) */' -%}
+      {%- set nested_join_hint = '/*+ SHUFFLE_REPLICATE_NL(s, d) */' -%}
+    {%- endif -%}
+
+    {#— column names carried by every candidate pair, as projected below —#}
+    {%- set pair_col_names = [] -%}
+    {%- for c in allSourceColumnNames %}
+      {%- do pair_col_names.append('`source_' ~ c ~ '`' if c in allTargetColumnNames else '`' ~ c ~ '`') -%}
+    {%- endfor %}
+    {%- for c in allTargetColumnNames %}
+      {%- do pair_col_names.append('`target_' ~ c ~ '`' if c in allSourceColumnNames else '`' ~ c ~ '`') -%}
+    {%- endfor %}
+    {%- do pair_col_names.extend(['lon1', 'lat1', 'lon2', 'lat2']) -%}
+
+    {%- set pair_select_str -%}
+        s_rowid,
+        {{ src_select_str }}{% if src_select_str and tgt_select_str %}, {% endif %}{{ tgt_select_str }},
+        s.lon1, s.lat1, d.lon2, d.lat2
+    {%- endset %}
+
+    {#— plain comparisons only; the antimeridian is handled by the 360 - |dlon| wrap —#}
+    {%- set bbox_condition -%}
+        d.lat2 BETWEEN s.min_lat AND s.max_lat
+        AND (
+          s.delta_lon IS NULL
+          OR ABS(d.lon2 - s.lon1) <= s.delta_lon
+          OR ABS(d.lon2 - s.lon1) >= 360 - s.delta_lon
+        )
+    {%- endset %}
+
+    {%- set distance_expr = _geo_distance_expr(formula, radius) %}
+
     WITH
     _src AS (
-      SELECT UUID() AS s_rowid, {{ src_cols_no_alias_str }}
+      SELECT
+        {#—
+          stable row identity: the user's key column, else a 64-bit surrogate. The
+          expanding rings read _src once per pass, so there it is a hash of the row.
+        —#}
+        {%- if sourceKeyColumn | trim | length > 0 %}
+        `{{ sourceKeyColumn }}` AS s_rowid, {{ src_cols_no_alias_str }},
+        {%- elif ring_steps %}
+        s_rowid, {{ src_cols_no_alias_str }},
+        {%- else %}
+        MONOTONICALLY_INCREASING_ID() AS s_rowid, {{ src_cols_no_alias_str }},
+        {%- endif %}
+        {{ _geo_point_coords(sourceType, sourceColumnName, '', 'lon1', 'lat1') }}
+      {%- if sourceKeyColumn | trim | length == 0 and ring_steps %}
+      FROM (
+        {{ _geo_keyed_rows('`' ~ relation_names[0] ~ '`', 's_rowid') }}
+      )
+      {%- else %}
       FROM `{{ relation_names[0] }}`
+      {%- endif %}
     ),
     _dst AS (
-      SELECT {{ tgt_cols_no_alias_str }}
+      SELECT
+        {{ tgt_cols_no_alias_str }},
+        {{ _geo_point_coords(destinationType, destinationColumnName, '', 'lon2', 'lat2') }}
       FROM `{{ relation_names[1] }}`
     ),
 
-    cross_pts AS (
+    {%- if ring_steps %}
+
+    {#—
+      Unbounded search: each pass looks in a wider k-ring, but only for the sources
+      still short of nearestPoints neighbours. A neighbour is confirmed once its
+      distance is inside the radius the ring is guaranteed to cover, so no closer
+      target can exist outside it. Sources left over after the last ring fall back
+      to the cross join.
+    —#}
+    _src_origin AS (
       SELECT
-        s_rowid,
-        {{ src_select_str }}{% if src_select_str and tgt_select_str %}, {% endif %}{{ tgt_select_str }},
-        s.`{{ sourceColumnName }}`   AS src_point,
-        d.`{{ destinationColumnName }}` AS dst_point
-      FROM _src s
-      CROSS JOIN _dst d
+        *,
+        H3_LONGLATASH3(lon1, lat1, {{ searchResolution }}) AS h3_origin
+      FROM _src
+    ),
+    _dst_cells AS (
+      SELECT
+        *,
+        H3_LONGLATASH3(lon2, lat2, {{ searchResolution }}) AS h3_cell
+      FROM _dst
     ),
+    {%- for k in ring_steps %}
+    {%- set i = loop.index %}
+    {%- set covered_radius = ((1.05 * k - 2.2) * search_edge_km * radius / 6371 * sphere_ratio) | round(6, 'floor') %}
 
-    coords AS (
+    _pending_{{ i }} AS (
+      {%- if loop.first %}
+      SELECT * FROM _src_origin
+      {%- else %}
+      SELECT p.*
+      FROM _pending_{{ i - 1 }} p
+      LEFT ANTI JOIN _found_{{ i - 1 }} f
+        ON p.s_rowid = f.s_rowid
+      {%- endif %}
+    ),
+    _ring_{{ i }} AS (
       SELECT
         *,
-        CAST(
-          SUBSTRING_INDEX(SUBSTRING_INDEX(src_point, '(', -1), ' ', 1)
-        AS DOUBLE) AS lon1,
-        CAST(
-          SUBSTRING_INDEX(
-            SUBSTRING_INDEX(SUBSTRING_INDEX(src_point, '(', -1), ')', 1),
-            ' ', -1
-          )
-        AS DOUBLE) AS lat1,
-        CAST(
-          SUBSTRING_INDEX(SUBSTRING_INDEX(dst_point, '(', -1), ' ', 1)
-        AS DOUBLE) AS lon2,
-        CAST(
-          SUBSTRING_INDEX(
-            SUBSTRING_INDEX(SUBSTRING_INDEX(dst_point, '(', -1), ')', 1),
-            ' ', -1
-          )
-        AS DOUBLE) AS lat2
-      FROM cross_pts
+        EXPLODE(H3_KRING(h3_origin, {{ k }})) AS h3_cell
+      FROM _pending_{{ i }}
     ),
+    _cand_{{ i }} AS (
+      SELECT
+        *,
+        {{ distance_expr }} AS {{ distance_col }}
+      FROM (
+        SELECT {{ equi_join_hint }}
+          {{ pair_select_str }}
+        FROM _ring_{{ i }} s
+        JOIN _dst_cells d
+          ON s.h3_cell = d.h3_cell
+      ) pairs
+    ),
+    _found_{{ i }} AS (
+      SELECT s_rowid
+      FROM _cand_{{ i }}
+      GROUP BY s_rowid
+      HAVING COUNT_IF(
+        {{ distance_col }} <= {{ covered_radius }}
+        {%- if ignoreZeroDistance %} AND {{ distance_col }} <> 0{%- endif %}
+      ) >= {{ nearestPoints | int }}
+    ),
+    {%- endfor %}
 
-    with_bearing AS (
+    _pending_rest AS (
+      SELECT p.*
+      FROM _pending_{{ ring_steps | length }} p
+      LEFT ANTI JOIN _found_{{ ring_steps | length }} f
+        ON p.s_rowid = f.s_rowid
+    ),
+
+    distances AS (
+      {%- for k in ring_steps %}
+      SELECT c.*
+      FROM _cand_{{ loop.index }} c
+      LEFT SEMI JOIN _found_{{ loop.index }} f
+        ON c.s_rowid = f.s_rowid
+      UNION ALL
+      {%- endfor %}
       SELECT
         *,
-        MOD(
-          DEGREES(
-            ATAN2(
-              RADIANS(lon2 - lon1),
-              LN(
-                TAN(RADIANS(lat2) / 2 + PI() / 4)
-                / TAN(RADIANS(lat1) / 2 + PI() / 4)
-              )
-            )
-          ) + 360,
-          360
-        ) AS bearing_deg
-      FROM coords
+        {{ distance_expr }} AS {{ distance_col }}
+      FROM (
+        SELECT {{ nested_join_hint }}
+          {{ pair_select_str }}
+        FROM _pending_rest s
+        CROSS JOIN _dst d
+      ) pairs
+    ),
+
+    {%- else %}
+    {%- set src_rel = '_src' %}
+    {%- if maxDistance > 0 %}
+    {%- set src_rel = '_src_bounds' %}
+    {%- set delta_lat = search_distance / radius * 57.29577951308232 + 0.000000001 %}
+
+    {#—
+      Lat/lon box around each source that holds every point within search_distance.
+      The longitude half-width is asin(sin(d / R) / cos(lat)); it is computed once
+      per source row and left NULL (any longitude) when the box reaches a pole.
+    —#}
+    _src_bounds AS (
+      SELECT
+        *,
+        lat1 - {{ delta_lat }} AS min_lat,
+        lat1 + {{ delta_lat }} AS max_lat,
+        CASE
+          WHEN ABS(lat1) + {{ delta_lat }} >= 90 THEN NULL
+          ELSE DEGREES(ASIN(SIN({{ search_distance / radius }}) / COS(RADIANS(lat1)))) + 0.000000001
+        END AS delta_lon
+      FROM _src
+    ),
+    {%- endif %}
+    {%- if h3_ring is not none %}
+
+    {#— every source fans out to the k-ring that can hold a match, targets map to one cell —#}
+    _src_cells AS (
+      SELECT
+        *,
+        EXPLODE(H3_KRING(H3_LONGLATASH3(lon1, lat1, {{ h3_ring[0] }}), {{ h3_ring[1] }})) AS h3_cell
+      FROM {{ src_rel }}
+    ),
+    _dst_cells AS (
+      SELECT
+        *,
+        H3_LONGLATASH3(lon2, lat2, {{ h3_ring[0] }}) AS h3_cell
+      FROM _dst
+    ),
+    {%- endif %}
+
+    coords AS (
+      SELECT {{ equi_join_hint if h3_ring is not none else nested_join_hint }}
+        {{ pair_select_str }}
+      {%- if h3_ring is not none %}
+      FROM _src_cells s
+      JOIN _dst_cells d
+        ON s.h3_cell = d.h3_cell
+      {%- if maxDistance > 0 %}
+        AND {{ bbox_condition }}
+      {%- endif %}
+      {%- elif maxDistance > 0 %}
+      FROM _src_bounds s
+      JOIN _dst d
+        ON {{ bbox_condition }}
+      {%- else %}
+      FROM _src s
+      CROSS JOIN _dst d
+      {%- endif %}
     ),
 
     distances AS (
       SELECT
         *,
-        {{ radius }} * 2 * ASIN(
-          SQRT(
-            POWER(SIN(RADIANS((lat2 - lat1) / 2)), 2)
-            + COS(RADIANS(lat1)) * COS(RADIANS(lat2))
-            * POWER(SIN(RADIANS((lon2 - lon1) / 2)), 2)
-          )
-        ) AS {{ distance_col }}
-      FROM with_bearing
+        {{ distance_expr }} AS {{ distance_col }}
+      FROM coords
+    ),
+
+    {%- endif %}
+
+    {%- set candidate_filter -%}
+        {%- if maxDistance == 0 %}
+        1=1
+        {%- else %}
+        {{ distance_col }} <= {{ maxDistance }}
+        {%- endif -%}
+        {%- if ignoreZeroDistance %} AND {{ distance_col }} <> 0{%- endif -%}
+    {%- endset %}
+
+    {%- if rankMethod == 'aggregate' %}
+
+    {#—
+      Top-N per source as a grouped aggregate instead of a window sort over every
+      candidate: MIN_BY keeps a single running best for nearestPoints = 1, larger N
+      sorts only each source's short candidate list and keeps the first N.
+    —#}
+    {%- set payload_str = ([distance_col] + pair_col_names) | join(', ') %}
+    top_n AS (
+      SELECT
+        s_rowid,
+        {%- if nearestPoints | int == 1 %}
+        MIN_BY(STRUCT({{ payload_str }}), {{ distance_col }}) AS best
+        {%- else %}
+        SLICE(
+          ARRAY_SORT(
+            COLLECT_LIST(STRUCT({{ payload_str }})),
+            (l, r) -> CASE
+              WHEN l.{{ distance_col }} IS NULL AND r.{{ distance_col }} IS NULL THEN 0
+              WHEN l.{{ distance_col }} IS NULL THEN 1
+              WHEN r.{{ distance_col }} IS NULL THEN -1
+              WHEN l.{{ distance_col }} < r.{{ distance_col }} THEN -1
+              WHEN l.{{ distance_col }} > r.{{ distance_col }} THEN 1
+              ELSE 0
+            END
+          ),
+          1,
+          {{ nearestPoints | int }}
+        ) AS best
+        {%- endif %}
+      FROM distances
+      WHERE
+        {{ candidate_filter }}
+      GROUP BY s_rowid
     ),
 
+    nearest AS (
+      SELECT
+        s_rowid,
+        {%- for c in [distance_col] + pair_col_names %}
+        b.{{ c }},
+        {%- endfor %}
+        {%- if nearestPoints | int == 1 %}
+        1 AS rn
+      FROM (SELECT s_rowid, best AS b FROM top_n WHERE best IS NOT NULL) top_1
+        {%- else %}
+        pos + 1 AS rn
+      FROM top_n
+      LATERAL VIEW POSEXPLODE(best) t AS pos, b
+        {%- endif %}
+
+    {%- else %}
+
     ranked AS (
       SELECT
         *,
@@ -182,22 +435,35 @@
         ) AS rn
       FROM distances
       WHERE
-        {%- if maxDistance == 0 %}
-        1=1
-        {%- else %}
-        {{ distance_col }} <= {{ maxDistance }}
-        {%- endif -%}
-        {%- if ignoreZeroDistance %} AND {{ distance_col }} <> 0{%- endif -%}
+        {{ candidate_filter }}
+    ),
+
+    nearest AS (
+      SELECT *
+      FROM ranked
+      WHERE rn <= {{ nearestPoints | int }}
+    {%- endif %}
+    ){% if outputDirection %},
+
+    {#— bearing only for the rows that survived ranking —#}
+    with_bearing AS (
+      SELECT
+        *,
+        {{ _geo_bearing_expr() }} AS bearing_deg
+      FROM nearest
     )
+    {%- endif %}
+
+    {%- set final_rel = 'with_bearing' if outputDirection else 'nearest' %}
 
     SELECT
       {#— Final source columns (qualified) —#}
       {%- set final_src_list = [] -%}
       {%- for c in allSourceColumnNames %}
         {%- if c in allTargetColumnNames %}
-          {%- do final_src_list.append('ranked.source_' ~ c ~ ' AS source_' ~ c) -%}
+          {%- do final_src_list.append(final_rel ~ '.source_' ~ c ~ ' AS source_' ~ c) -%}
         {%- else %}
-          {%- do final_src_list.append('ranked.`' ~ c ~ '`') -%}
+          {%- do final_src_list.append(final_rel ~ '.`' ~ c ~ '`') -%}
         {%- endif %}
       {%- endfor %}
       {%- set final_src_str = final_src_list | join(', ') -%}
@@ -206,29 +472,23 @@
       {%- set final_tgt_list = [] -%}
       {%- for c in allTargetColumnNames %}
         {%- if c in allSourceColumnNames %}
-          {%- do final_tgt_list.append('ranked.target_' ~ c ~ ' AS target_' ~ c) -%}
+          {%- do final_tgt_list.append(final_rel ~ '.target_' ~ c ~ ' AS target_' ~ c) -%}
         {%- else %}
-          {%- do final_tgt_list.append('ranked.`' ~ c ~ '`') -%}
+          {%- do final_tgt_list.append(final_rel ~ '.`' ~ c ~ '`') -%}
         {%- endif %}
       {%- endfor %}
       {%- set final_tgt_str = final_tgt_list | join(', ') -%}
 
       {{ final_src_str }}{% if final_src_str and final_tgt_str %}, {% endif %}{{ final_tgt_str }},
       rn AS rank_number,
-      {{ distance_col }},
-      CASE
-        WHEN bearing_deg < 22.5 OR bearing_deg >= 337.5 THEN 'N'
-        WHEN bearing_deg < 67.5 THEN 'NE'
-        WHEN bearing_deg < 112.5 THEN 'E'
-        WHEN bearing_deg < 157.5 THEN 'SE'
-        WHEN bearing_deg < 202.5 THEN 'S'
-        WHEN bearing_deg < 247.5 THEN 'SW'
-        WHEN bearing_deg < 292.5 THEN 'W'
-        ELSE 'NW'
-      END AS cardinal_direction
-    FROM ranked
-    WHERE rn <= {{ nearestPoints }}
-    ORDER BY lat1, lon1, rn
+      {{ distance_col }}
+      {%- if outputDirection %},
+      {{ _geo_cardinal_direction('bearing_deg') }} AS cardinal_direction
+      {%- endif %}
+    FROM {{ final_rel }}
+    {%- if sortOutput %}
+    ORDER BY lat1, lon1, s_rowid, rn
+    {%- endif %}
 
   {%- else -%}
 
@@ -238,3 +498,37 @@
   {%- endif -%}
 
 {%- endmacro %}
+
+
+{#—
+  Picks the H3 resolution and k-ring size for a search radius given in km.
+  H3 edge lengths stay within roughly 0.7x-1.1x of the per-resolution average, so
+  a point within `distance_km` of a source is always inside the k-ring of the
+  source cell when k >= (distance_km + 2.2 * edge) / (1.05 * edge). The finest
+  resolution that keeps k small wins; returns none if even resolution 0 is too
+  fine, in which case the caller falls back to the cross join. Inverting the same
+  bound gives the radius a k-ring is guaranteed to cover: (1.05 * k - 2.2) * edge.
+—#}
+{% macro _FindNearest_h3_search_ring(distance_km, max_k=6) -%}
+  {%- set ns = namespace(ring=none) -%}
+  {%- for res in range(15, -1, -1) -%}
+    {%- set edge = _FindNearest_h3_edge_km(res) -%}
+    {%- set k = ((distance_km + 2.2 * edge) / (1.05 * edge)) | round(0, 'ceil') | int -%}
+    {%- if ns.ring is none and k <= max_k -%}
+      {%- set ns.ring = [res, k] -%}
+    {%- endif -%}
+  {%- endfor -%}
+  {{ return(ns.ring) }}
+{%- endmacro %}
+
+
+{#— Average H3 hexagon edge length in km at the given resolution —#}
+{% macro _FindNearest_h3_edge_km(resolution) -%}
+  {%- set avg_edge_km = [
+    1281.256011, 483.0568391, 182.5129565, 68.97922179,
+    26.07175968, 9.854090990, 3.724532667, 1.406475763,
+    0.531414010, 0.200786148, 0.075863783, 0.028663897,
+    0.010830188, 0.004092010, 0.001546100, 0.000584169
+  ] -%}
+  {{ return(avg_edge_km[resolution | int]) }}
+{%- endmacro %}
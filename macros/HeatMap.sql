@@ -4,14 +4,28 @@
         resolution,
         gridDistance,
         heatColumnName = none,
-        decayType      = 'constant') -%}
+        decayType      = 'constant',
+        minResolution  = none,
+        incrementalColumn = none,
+        outputGeometry = 'wkt',
+        outputCellId   = false,
+        outputCentroid = false,
+        kernelBandwidth = none,
+        ringWeights    = []) -%}
     {{ return(adapter.dispatch('HeatMap', 'prophecy_spatial')(relation_name,
         longitudeColumnName,
         latitudeColumnName,
         resolution,
         gridDistance,
         heatColumnName,
-        decayType)) }}
+        decayType,
+        minResolution,
+        incrementalColumn,
+        outputGeometry,
+        outputCellId,
+        outputCentroid,
+        kernelBandwidth,
+        ringWeights)) }}
 {% endmacro %}
 
 {%- macro default__HeatMap(
@@ -21,7 +35,14 @@
         resolution,
         gridDistance,
         heatColumnName = none,
-        decayType      = 'constant'
+        decayType      = 'constant',
+        minResolution  = none,
+        incrementalColumn = none,
+        outputGeometry = 'wkt',
+        outputCellId   = false,
+        outputCentroid = false,
+        kernelBandwidth = none,
+        ringWeights    = []
     ) -%}
 
 {# ── 0. quick passthrough check ─────────────────────────────────────────────── #}
@@ -41,6 +62,27 @@
 {# normalise decayType once for SQL CASEs #}
 {%- set decay = (decayType | lower | trim) or 'constant' -%}
 
+{#
+  pyramid: every resolution from minResolution up to resolution, in one pass. A
+  given minResolution always selects it, even when it equals resolution, so the
+  output keeps its resolution column.
+#}
+{%- set pyramid = minResolution is not none -%}
+{%- if pyramid and (minResolution | int) > (resolution | int) -%}
+    {{ exceptions.raise_compiler_error("HeatMap: minResolution must not be greater than resolution") }}
+{%- endif -%}
+
+{#
+  incremental: the model's own table keeps raw heat and the latest watermark per
+  cell. Later runs bin only newer points, merge them into the stored heat and
+  re-smooth only the cells within gridDistance of a changed cell; the model is
+  expected to be materialized incrementally with unique_key 'h3_cell'.
+#}
+{%- set incremental = incrementalColumn is not none and incrementalColumn | trim | length > 0 -%}
+{%- set merge_state = incremental and is_incremental() -%}
+{%- set counts_relation = 'cell_counts_delta' if merge_state else 'cell_counts' -%}
+{%- set k = gridDistance | int %}
+
 -- ── Hex-bin & weighted / decayed density ─────────────────────────────────────
 WITH points_h3 AS (
     SELECT
@@ -50,58 +92,226 @@ WITH points_h3 AS (
             {{ resolution }}
         )                            AS h3_cell,
         {{ heat_expr }}              AS point_heat
+        {%- if incremental %},
+        {{ incrementalColumn }}      AS watermark
+        {%- endif %}
     FROM {{ relation_name }}
+    {%- if merge_state %}
+    WHERE {{ incrementalColumn }} > (SELECT MAX(watermark) FROM {{ this }})
+    {%- endif %}
 ),
 
-cell_counts AS (
+{% if pyramid %}
+cell_counts_finest AS (
+    -- raw (weighted) heat per hex at the finest resolution
+    SELECT
+        h3_cell,
+        SUM(point_heat) AS raw_heat
+        {%- if incremental %},
+        MAX(watermark) AS watermark
+        {%- endif %}
+    FROM points_h3
+    GROUP BY h3_cell
+),
+
+{{ counts_relation }} AS (
+    -- roll the finest cells up to each coarser level; cell ids encode their
+    -- resolution, so one aggregation builds every level
+    SELECT
+        parent AS h3_cell,
+        SUM(c.raw_heat) AS raw_heat
+        {%- if incremental %},
+        MAX(c.watermark) AS watermark
+        {%- endif %}
+    FROM cell_counts_finest AS c
+    LATERAL VIEW explode(
+        transform(
+            sequence({{ minResolution }}, {{ resolution }}),
+            r -> h3_toparent(c.h3_cell, r)
+        )
+    ) t AS parent
+    GROUP BY parent
+),
+{% else %}
+{{ counts_relation }} AS (
     -- raw (weighted) heat per hex
     SELECT
         h3_cell,
         SUM(point_heat) AS raw_heat
+        {%- if incremental %},
+        MAX(watermark) AS watermark
+        {%- endif %}
     FROM points_h3
     GROUP BY h3_cell
 ),
+{% endif %}
+
+{% if merge_state %}
+affected_cells AS (
+    -- cells whose density changes: within k of a cell with new heat
+    SELECT DISTINCT neighbour AS h3_cell
+    FROM cell_counts_delta AS d
+    LATERAL VIEW explode(h3_kring(d.h3_cell, {{ k }})) t AS neighbour
+),
+
+input_cells AS (
+    -- cells whose heat reaches an affected cell: within 2k of a cell with new heat
+    SELECT DISTINCT neighbour AS h3_cell
+    FROM cell_counts_delta AS d
+    LATERAL VIEW explode(h3_kring(d.h3_cell, {{ 2 * k }})) t AS neighbour
+),
+
+cell_counts AS (
+    -- stored heat of those cells merged with the new points
+    SELECT
+        COALESCE(s.h3_cell, d.h3_cell) AS h3_cell,
+        COALESCE(s.raw_heat, 0) + COALESCE(d.raw_heat, 0) AS raw_heat,
+        GREATEST(s.watermark, d.watermark) AS watermark
+    FROM (
+        SELECT
+            state.h3_cell,
+            state.raw_heat,
+            state.watermark
+        FROM {{ this }} AS state
+        LEFT SEMI JOIN input_cells AS i
+            ON state.h3_cell = i.h3_cell
+    ) AS s
+    FULL OUTER JOIN cell_counts_delta AS d
+        ON s.h3_cell = d.h3_cell
+),
+{% endif %}
+{#
+  Kernels are compiled into one weight per ring (grid distance 0..k), so the
+  smoothing is a join against a tiny ring -> weight relation and a multiply.
+  Rings whose weight is 0 are left out and never reach the aggregation.
+  bandwidth is in rings: gaussian sigma (default k / 2), epanechnikov support
+  (default k + 1, so the outer ring keeps a small share).
+#}
+{%- set kernels = ['constant', 'linear', 'exp', 'gaussian', 'epanechnikov', 'custom'] %}
+{%- if decay not in kernels %}
+    {{ exceptions.raise_compiler_error("HeatMap: unknown decayType '" ~ decayType ~ "', expected one of " ~ kernels | join(', ')) }}
+{%- endif %}
+{%- if decay == 'custom' and ringWeights | length > k + 1 %}
+    {{ exceptions.raise_compiler_error("HeatMap: ringWeights has more entries than gridDistance + 1 rings") }}
+{%- endif %}
+{%- set bandwidth = kernelBandwidth | float if kernelBandwidth is not none and kernelBandwidth | float > 0 else none %}
+
+{%- set ring_weights = [] %}
+{%- if k > 0 and decay != 'constant' %}
+    {%- for d in range(k + 1) %}
+        {%- if decay == 'linear' %}
+            {# 1 − d / (k + 1)  (outer ring gets a small, non-zero share) #}
+            {%- do ring_weights.append(1 - d / (k + 1)) %}
+        {%- elif decay == 'exp' %}
+            {# halves each ring: 0.5^d #}
+            {%- do ring_weights.append(0.5 ** d) %}
+        {%- elif decay == 'gaussian' %}
+            {# e^(−d² / 2σ²) #}
+            {%- set sigma = bandwidth or k / 2 %}
+            {%- do ring_weights.append(2.718281828459045 ** (-(d * d) / (2 * sigma * sigma))) %}
+        {%- elif decay == 'epanechnikov' %}
+            {# 1 − (d / h)², zero from h on #}
+            {%- set h = bandwidth or k + 1 %}
+            {%- do ring_weights.append([1 - (d / h) ** 2, 0] | max) %}
+        {%- else %}
+            {# user supplied, centre first; missing outer rings weigh 0 #}
+            {%- do ring_weights.append((ringWeights[d] if d < ringWeights | length else 0) | float) %}
+        {%- endif %}
+    {%- endfor %}
+{%- endif %}
+
+{%- if ring_weights | length > 0 and ring_weights | select('ne', 0) | list | length == 0 %}
+    {{ exceptions.raise_compiler_error("HeatMap: every ring weight is 0") }}
+{%- endif %}
+
+{% if ring_weights | length > 0 %}
+ring_weights AS (
+    SELECT * FROM VALUES
+        {%- for d in range(ring_weights | length) if ring_weights[d] != 0 %}
+        ({{ d }}, {{ ring_weights[d] }}){% if not loop.last %},{% endif %}
+        {%- endfor %}
+        AS w(ring, weight)
+),
+{% endif %}
 
 cell_counts_smoothed AS (
-    -- k-ring smoothing + decay kernel
+{%- if k == 0 %}
+    -- no smoothing requested: the density is the raw heat
+    SELECT
+        h3_cell,
+        raw_heat AS density
+    FROM cell_counts
+{%- elif ring_weights | length == 0 %}
+    -- k-ring smoothing, every neighbour gets the full heat
     SELECT
         neighbour AS h3_cell,
-        SUM(
-            c.raw_heat *
-            CASE
-                {% if gridDistance == 0 %}
-                    WHEN true THEN 1     -- no smoothing requested
-                {% else %}
-                    {% if decay == 'constant' %}
-                        WHEN true THEN 1
-                    {% elif decay == 'linear' %}
-                        -- 1 − d / k + 1  (outer ring gets a small, non-zero share)
-                        WHEN true THEN (1 - (h3_distance(c.h3_cell, neighbour) / ({{ gridDistance }} + 1)))
-                    {% elif decay == 'exp' %}
-                        -- halves each ring: 0.5^d
-                        WHEN true THEN POWER(0.5, h3_distance(c.h3_cell, neighbour))
-                    {% else %}  {# exponential #}
-                        -- halves each ring: 0.5^d
-                        WHEN true THEN 1
-                    {% endif %}
-                {% endif %}
-            END
-        ) AS density
+        SUM(c.raw_heat) AS density
     FROM cell_counts AS c
-    LATERAL VIEW explode(
-        CASE
-            WHEN {{ gridDistance }} = 0
-                 THEN array(c.h3_cell)
-                 ELSE h3_kring(c.h3_cell, {{ gridDistance }})
-        END
-    ) t AS neighbour
+    LATERAL VIEW explode(h3_kring(c.h3_cell, {{ k }})) t AS neighbour
     GROUP BY neighbour
+{%- else %}
+    -- k-ring smoothing + decay kernel: neighbours come with their ring, whose
+    -- weight comes from the broadcast ring_weights lookup
+    SELECT /*+ BROADCAST(w) */
+        n.h3_cell,
+        SUM(n.raw_heat * w.weight) AS density
+    FROM (
+        SELECT
+            t.neighbour.cellid   AS h3_cell,
+            t.neighbour.distance AS ring,
+            c.raw_heat
+        FROM cell_counts AS c
+        LATERAL VIEW explode(h3_kringdistances(c.h3_cell, {{ k }})) t AS neighbour
+    ) AS n
+    JOIN ring_weights AS w
+        ON n.ring = w.ring
+    GROUP BY n.h3_cell
+{%- endif %}
 )
 
+{#
+  Output columns: the BIGINT cell id is the compact form; boundary WKT/WKB and the
+  centroid are only produced when asked for, once per output cell.
+#}
+{%- set output_columns = [] %}
+{%- if incremental %}
+    {%- do output_columns.extend(['sm.h3_cell', 'COALESCE(c.raw_heat, 0) AS raw_heat', 'c.watermark']) %}
+{%- elif outputCellId %}
+    {%- do output_columns.append('sm.h3_cell') %}
+{%- endif %}
+{%- if pyramid %}
+    {%- do output_columns.append('h3_resolution(sm.h3_cell) AS resolution') %}
+{%- endif %}
+{%- do output_columns.append('round(sm.density,2) as density') %}
+{%- if outputGeometry == 'wkt' %}
+    {%- do output_columns.append('h3_boundaryaswkt(sm.h3_cell) AS geometry_wkt') %}
+{%- elif outputGeometry == 'wkb' %}
+    {%- do output_columns.append('h3_boundaryaswkb(sm.h3_cell) AS geometry_wkb') %}
+{%- endif %}
+{%- if outputCentroid %}
+    {%- do output_columns.extend(['sm.centroid_lon', 'sm.centroid_lat']) %}
+{%- endif %}
+
 SELECT
-    round(density,2) as density,
-    h3_boundaryaswkt(h3_cell) AS geometry_wkt
-FROM cell_counts_smoothed
+    {{ output_columns | join(',\n    ') }}
+{%- if outputCentroid %}
+FROM (
+    SELECT
+        *,
+        {{ _geo_point_coords('h3', 'h3_cell', '', 'centroid_lon', 'centroid_lat') }}
+    FROM cell_counts_smoothed
+) AS sm
+{%- else %}
+FROM cell_counts_smoothed AS sm
+{%- endif %}
+{%- if incremental %}
+LEFT JOIN cell_counts AS c
+    ON sm.h3_cell = c.h3_cell
+{%- endif %}
+{%- if merge_state %}
+LEFT SEMI JOIN affected_cells AS a
+    ON sm.h3_cell = a.h3_cell
+{%- endif %}
 
 {%- endif -%}
 {%- endmacro -%}
@@ -3,13 +3,23 @@
         longitudeColumnName,
         latitudeColumnName,
         groupColumnName='',
-        sequenceColumnName='') -%}
+        sequenceColumnName='',
+        assemblyMode='collect',
+        chunkSize=10000,
+        maxVertices=0,
+        thinningMethod='none',
+        thinningTolerance=0) -%}
     {{ return(adapter.dispatch('PolyBuild', 'prophecy_spatial')(relation_name,
         buildMethod,
         longitudeColumnName,
         latitudeColumnName,
         groupColumnName,
-        sequenceColumnName)) }}
+        sequenceColumnName,
+        assemblyMode,
+        chunkSize,
+        maxVertices,
+        thinningMethod,
+        thinningTolerance)) }}
 {% endmacro %}
 
 {% macro default__PolyBuild(
@@ -18,7 +28,12 @@
         longitudeColumnName,
         latitudeColumnName,
         groupColumnName='',
-        sequenceColumnName=''
+        sequenceColumnName='',
+        assemblyMode='collect',
+        chunkSize=10000,
+        maxVertices=0,
+        thinningMethod='none',
+        thinningTolerance=0
 ) %}
 
 {# ── 0. quick passthrough check ────────────────────────────────────────── #}
@@ -39,6 +54,43 @@
     {% if has_group %}{% set grp = adapter.quote(groupColumnName) %}{% endif %}
     {% if has_seq  %}{% set seq = adapter.quote(sequenceColumnName) %}{% endif %}
 
+    {#
+      chunked: vertices are numbered with a window (a sort that can spill instead
+      of one in-memory array per group), rendered in chunks of chunkSize and the
+      chunk strings concatenated, so only the finished WKT is ever group-sized.
+      maxVertices > 0 additionally splits each line into segments of at most
+      that many vertices, consecutive segments sharing their boundary vertex.
+    #}
+    {% set chunked = assemblyMode | lower == 'chunked' %}
+    {% set split = chunked and maxVertices | int > 0 %}
+    {% if split and method == 'sequencepolygon' %}
+        {{ exceptions.raise_compiler_error("PolyBuild: maxVertices can only split polylines, not polygons") }}
+    {% endif %}
+    {% if split and maxVertices | int < 2 %}
+        {{ exceptions.raise_compiler_error("PolyBuild: maxVertices must be at least 2") }}
+    {% endif %}
+    {% set segment_step = maxVertices | int - 1 %}
+
+    {#
+      thinning (tolerance in meters), applied to the sorted points before any
+      vertex string exists:
+        distance       – grid snapping: consecutive points in the same
+                         tolerance-sized grid cell collapse into the first one
+                         (ends are always kept), so every dropped point lies
+                         within ~1.5 × tolerance of a kept one
+        douglaspeucker – the sorted points become a geometry directly and go
+                         through ST_Simplify (tolerance converted at 111,320 m per
+                         degree, exact along latitude, looser along longitude away
+                         from the equator); needs the in-memory assembly
+    #}
+    {% set thinning = (thinningMethod or 'none') | lower %}
+    {% set thin_distance = thinning == 'distance' and thinningTolerance | float > 0 %}
+    {% set thin_dp = thinning == 'douglaspeucker' and thinningTolerance | float > 0 %}
+    {% if thin_dp and chunked %}
+        {{ exceptions.raise_compiler_error("PolyBuild: Douglas-Peucker thinning needs the in-memory assembly") }}
+    {% endif %}
+    {% set vertex_order %}{% if has_seq %}vertex.seq, {% endif %}vertex.lon, vertex.lat{% endset %}
+
     WITH coords AS (
 
         SELECT
@@ -49,55 +101,215 @@
                 1 AS grouping_column_name,
             {%- endif %}
 
-            {# sequence key #}
-            {% if has_seq -%}
-                CONCAT({{ seq }}, {{ lon }}, {{ lat }}) AS sequencing_column_name,
-            {%- else -%}
-                CONCAT({{ lon }}, {{ lat }})            AS sequencing_column_name,
-            {%- endif %}
-
-            {{ lon }} AS lon,
-            {{ lat }} AS lat,
-            CONCAT(CAST({{ lon }} AS STRING), ' ', CAST({{ lat }} AS STRING)) AS coord
+            {# typed vertex: sorts on the native sequence value, lon/lat break ties #}
+            struct(
+                {% if has_seq -%}
+                    {{ seq }} AS seq,
+                {%- endif %}
+                {{ lon }} AS lon,
+                {{ lat }} AS lat
+            ) AS vertex
         FROM {{ relation_name }}
 
+    {% if chunked and thin_distance %}
+    ), thinned AS (
+
+        SELECT
+            grouping_column_name,
+            vertex
+        FROM (
+            SELECT
+                grouping_column_name,
+                vertex,
+                cell,
+                LAG(cell) OVER (PARTITION BY grouping_column_name ORDER BY {{ vertex_order }}) AS prev_cell,
+                LEAD(1) OVER (PARTITION BY grouping_column_name ORDER BY {{ vertex_order }}) IS NULL AS is_last
+            FROM (
+                SELECT
+                    grouping_column_name,
+                    vertex,
+                    {{ _PolyBuild_grid_cell('vertex', thinningTolerance) }} AS cell
+                FROM coords
+            )
+        )
+        WHERE prev_cell IS NULL OR is_last OR cell <> prev_cell
+
+    {% endif %}
+    {% if chunked %}
+    ), numbered AS (
+
+        SELECT
+            grouping_column_name,
+            ROW_NUMBER() OVER (
+                PARTITION BY grouping_column_name
+                ORDER BY {{ vertex_order }}
+            ) AS vertex_index,
+            vertex.lon AS lon,
+            vertex.lat AS lat
+        FROM {{ 'thinned' if thin_distance else 'coords' }}
+
+    {% if split %}
+    ), segmented AS (
+
+        {# a boundary vertex ends one segment and starts the next #}
+        SELECT
+            n.*,
+            segment_index
+        FROM numbered AS n
+        LATERAL VIEW explode(
+            CASE
+                WHEN vertex_index > 1 AND (vertex_index - 1) % {{ segment_step }} = 0
+                     THEN array((vertex_index - 1) DIV {{ segment_step }} - 1, (vertex_index - 1) DIV {{ segment_step }})
+                ELSE array((vertex_index - 1) DIV {{ segment_step }})
+            END
+        ) s AS segment_index
+
+    {% endif %}
+    ), chunks AS (
+
+        SELECT
+            grouping_column_name,
+            {% if split %}segment_index,{% endif %}
+            (vertex_index - 1) DIV {{ chunkSize | int }} AS chunk_index,
+            COUNT(*) AS chunk_vertices,
+            transform(
+                sort_array(collect_list(struct(vertex_index, lon, lat))),
+                x -> CONCAT(CAST(x.lon AS STRING), ' ', CAST(x.lat AS STRING))
+            ) AS chunk_v
+        FROM {{ 'segmented' if split else 'numbered' }}
+        GROUP BY grouping_column_name, {% if split %}segment_index, {% endif %}(vertex_index - 1) DIV {{ chunkSize | int }}
+
+    ), verts AS (
+
+        SELECT
+            grouping_column_name,
+            {% if split %}segment_index,{% endif %}
+            concat_ws(', ', transform(ordered_chunks, c -> c.chunk_wkt)) AS vertex_list,
+            ordered_chunks[0].first_vertex AS first_vertex
+        FROM (
+            SELECT
+                grouping_column_name,
+                {% if split %}segment_index,{% endif %}
+                sort_array(collect_list(struct(
+                    chunk_index,
+                    concat_ws(', ', chunk_v) AS chunk_wkt,
+                    element_at(chunk_v, 1)   AS first_vertex
+                ))) AS ordered_chunks
+            FROM chunks
+            GROUP BY grouping_column_name{% if split %}, segment_index
+            HAVING SUM(chunk_vertices) >= 2  -- a lone trailing boundary vertex is no segment{% endif %}
+        )
+
+    )
+    {% else %}
     ), ordered AS (
 
         SELECT
             grouping_column_name,
-            sort_array(collect_list(struct(sequencing_column_name, coord))) AS ordered_coords
+            sort_array(collect_list(vertex)) AS ordered_vertices
         FROM coords
         GROUP BY grouping_column_name
 
-    ), verts AS (
+    {% if thin_distance %}
+    ), thinned AS (
 
         SELECT
             grouping_column_name,
-            transform(ordered_coords, x -> x.coord) AS v
+            filter(
+                ordered_vertices,
+                (x, i) -> i = 0
+                    OR i = size(ordered_vertices) - 1
+                    OR {{ _PolyBuild_grid_cell('x', thinningTolerance) }}
+                       <> {{ _PolyBuild_grid_cell('ordered_vertices[i - 1]', thinningTolerance) }}
+            ) AS ordered_vertices
         FROM ordered
 
+    {% endif %}
+    {% if thin_dp %}
+    ), verts AS (
+
+        {# no vertex strings at all: points → geometry → ST_Simplify → WKT #}
+        SELECT
+            grouping_column_name,
+            ST_AsText(
+                ST_Simplify(
+                    {% if method == 'sequencepolygon' -%}
+                    ST_MakePolygon(ST_MakeLine(concat(points, slice(points, 1, 1)))),
+                    {%- else -%}
+                    ST_MakeLine(points),
+                    {%- endif %}
+                    {{ thinningTolerance | float / 111320 }}
+                )
+            ) AS geometry_wkt
+        FROM (
+            SELECT
+                grouping_column_name,
+                transform(ordered_vertices, x -> ST_Point(x.lon, x.lat)) AS points
+            FROM ordered
+        )
+
     )
+    {% else %}
+    ), verts AS (
+
+        {# vertex strings are built once, after sorting #}
+        SELECT
+            grouping_column_name,
+            concat_ws(', ', v) AS vertex_list,
+            element_at(v, 1)   AS first_vertex
+        FROM (
+            SELECT
+                grouping_column_name,
+                transform(
+                    ordered_vertices,
+                    x -> CONCAT(CAST(x.lon AS STRING), ' ', CAST(x.lat AS STRING))
+                ) AS v
+            FROM {{ 'thinned' if thin_distance else 'ordered' }}
+        )
+
+    )
+    {% endif %}
+    {% endif %}
 
     SELECT
         {% if has_group %}
             grouping_column_name,
         {% endif %}
+        {% if split %}
+            segment_index,
+        {% endif %}
+        {% if thin_dp %}
+        geometry_wkt
+        {% else %}
         CASE
             WHEN '{{ method }}' = 'sequencepolygon'
                  THEN CONCAT(
                         'POLYGON((',
-                        concat_ws(', ', v),
+                        vertex_list,
                         ', ',
-                        element_at(v, 1),   -- close ring
+                        first_vertex,   -- close ring
                         '))'
                       )
             ELSE  /* 'sequencepolyline' */
                  CONCAT(
                         'LINESTRING(',
-                        concat_ws(', ', v),
+                        vertex_list,
                         ')'
                       )
         END AS geometry_wkt
+        {% endif %}
     FROM verts
 {% endif %}
-{% endmacro %}
\ No newline at end of file
+{% endmacro %}
+
+
+{#
+  Grid cell of a vertex struct for distance thinning: about tolerance_m meters on
+  each side. Longitude is scaled by the cosine of the latitude row's centre, so
+  every cell in a row shares one scale and the grid does not shear with distance
+  from the prime meridian.
+#}
+{% macro _PolyBuild_grid_cell(vertex, tolerance_m) -%}
+{%- set row -%}FLOOR({{ vertex }}.lat * 111320 / {{ tolerance_m }}){%- endset -%}
+struct(FLOOR({{ vertex }}.lon * COS(RADIANS(({{ row }} + 0.5) * {{ tolerance_m }} / 111320)) * 111320 / {{ tolerance_m }}), {{ row }})
+{%- endmacro %}
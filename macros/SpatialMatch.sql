@@ -2,12 +2,30 @@
     schemas,
     source_col,
     target_col,
-    type) -%}
+    type,
+    matchMethod='crossjoin',
+    h3Resolution=7,
+    rangeJoinBinSize=0,
+    keyColumns=[],
+    matchCardinality='all',
+    priorityColumn='',
+    priorityDescending=false,
+    sourceFormat='wkt',
+    targetFormat='wkt') -%}
     {{ return(adapter.dispatch('SpatialMatch', 'prophecy_spatial')(relation_names,
     schemas,
     source_col,
     target_col,
-    type)) }}
+    type,
+    matchMethod,
+    h3Resolution,
+    rangeJoinBinSize,
+    keyColumns,
+    matchCardinality,
+    priorityColumn,
+    priorityDescending,
+    sourceFormat,
+    targetFormat)) }}
 {% endmacro %}
 
 {% macro default__SpatialMatch(
@@ -15,7 +33,16 @@
     schemas,
     source_col,
     target_col,
-    type
+    type,
+    matchMethod='crossjoin',
+    h3Resolution=7,
+    rangeJoinBinSize=0,
+    keyColumns=[],
+    matchCardinality='all',
+    priorityColumn='',
+    priorityDescending=false,
+    sourceFormat='wkt',
+    targetFormat='wkt'
 ) -%}
 
   {% set fn_map = {
@@ -28,47 +55,387 @@
   {% set source_relation = relation_names[0] %}
   {% set target_relation = relation_names[1] %}
 
+  {#
+    Match cardinality per source row: every matching pair ('all'), the source row
+    once if anything matches ('any'), the single best match by a target priority
+    column ('first'), or just the number of matches ('count'), which also returns
+    the source rows nothing matched, with 0. 'any' and 'count' return no target
+    columns.
+  #}
+  {% set semi_join = matchCardinality == 'any' %}
+  {% set aggregate = matchCardinality in ['first', 'count'] %}
+  {% set keep_target = matchCardinality in ['all', 'first'] %}
+
   {% set source_columns = schemas[0] %}
-  {% set target_columns = schemas[1] %}
+  {% set target_columns = schemas[1] if keep_target else [] %}
+
+  {#
+    With a key column (unique per row) only the key goes through the spatial join
+    and the other output columns are joined back on it; a side whose output is
+    just its key never gets re-joined. Without one, that side's output columns
+    ride along through the join in a single pass. Collapsing the matches of a
+    source row needs the source key, picking the first target the target key.
+  #}
+  {% set source_key = keyColumns[0] if keyColumns | length > 0 else '' %}
+  {% set target_key = keyColumns[1] if keyColumns | length > 1 else '' %}
+  {% if matchCardinality != 'all' and not source_key %}
+    {{ exceptions.raise_compiler_error("SpatialMatch: matchCardinality '" ~ matchCardinality ~ "' needs a source key column") }}
+  {% endif %}
+  {% if matchCardinality == 'first' and not target_key %}
+    {{ exceptions.raise_compiler_error("SpatialMatch: matchCardinality 'first' needs a target key column") }}
+  {% endif %}
+  {% set source_rejoin = source_key | length > 0 and source_columns | reject('equalto', source_key) | list | length > 0 %}
+  {% set target_rejoin = target_key | length > 0 and target_columns | reject('equalto', target_key) | list | length > 0 %}
+
+  {# columns each side carries through the join: its row id, or its output columns #}
+  {% set source_carry = ['s_rowid'] if source_key else source_columns %}
+  {% set target_carry = ['t_rowid'] if target_key else [] %}
+  {% if not target_key %}
+    {% for col in target_columns %}
+      {% do target_carry.append('target_' ~ col) %}
+    {% endfor %}
+  {% endif %}
 
   {% set source_select = [] %}
   {% for col in source_columns %}
-    {% do source_select.append('source.' ~ col) %}
+    {% if source_rejoin %}
+      {% do source_select.append('source.' ~ col) %}
+    {% elif source_key %}
+      {% do source_select.append('m.s_rowid AS ' ~ col) %}
+    {% else %}
+      {% do source_select.append('m.' ~ col) %}
+    {% endif %}
   {% endfor %}
 
   {% set target_select = [] %}
   {% for col in target_columns %}
-    {% do target_select.append('target.' ~ col ~ ' AS target_' ~ col) %}
+    {% if target_rejoin %}
+      {% do target_select.append('target.' ~ col ~ ' AS target_' ~ col) %}
+    {% elif target_key %}
+      {% do target_select.append('m.t_rowid AS target_' ~ col) %}
+    {% else %}
+      {% do target_select.append('m.target_' ~ col) %}
+    {% endif %}
   {% endfor %}
 
   {% set spatial_fn = fn_map.get(type) %}
 
-  SELECT
-    {{ (source_select + target_select) | join(',\n    ') }}
-  FROM {{ source_relation }} AS source
-  CROSS JOIN {{ target_relation }} AS target
-  WHERE
+  {% set use_h3 = matchMethod == 'h3index' and (spatial_fn or type in ['touches_or_intersects', 'envelope']) %}
+
+  {% set match_condition %}
     {% if spatial_fn %}
-      {{ spatial_fn }}(
-        ST_GeomFromText(source.{{ source_col }}),
-        ST_GeomFromText(target.{{ target_col }})
-      )
+      {{ spatial_fn }}(source._source_geom, target._target_geom)
     {% elif type == 'touches_or_intersects' %}
-      ST_Touches(
-        ST_GeomFromText(source.{{ source_col }}),
-        ST_GeomFromText(target.{{ target_col }})
-      )
-      OR ST_Intersects(
-        ST_GeomFromText(source.{{ source_col }}),
-        ST_GeomFromText(target.{{ target_col }})
-      )
+      {# touching geometries always intersect, so one test covers both #}
+      ST_Intersects(source._source_geom, target._target_geom)
     {% elif type == 'envelope' %}
-      ST_Intersects(
-        ST_Envelope(ST_GeomFromText(source.{{ source_col }})),
-        ST_Envelope(ST_GeomFromText(target.{{ target_col }}))
-      )
+      {# the bounding-box overlap already is the envelope test #}
+      1=1
     {% else %}
       1=1 -- fallback if no known type
     {% endif %}
+  {% endset %}
+
+  {#
+    Two phases: overlapping bounding boxes (plain numeric comparisons on columns
+    computed once per row) are necessary for every match type, so only pairs that
+    pass them reach the exact ST_* predicate.
+  #}
+  {% set match_select = [] %}
+  {% for col in source_carry %}
+    {% do match_select.append('source.' ~ col) %}
+  {% endfor %}
+  {% for col in target_carry %}
+    {% do match_select.append('target.' ~ col) %}
+  {% endfor %}
+  {% if matchCardinality == 'first' and priorityColumn %}
+    {% do match_select.append('target._target_priority') %}
+  {% endif %}
+
+  {% set has_predicate = spatial_fn or type in ['touches_or_intersects', 'envelope'] %}
+  {% set bbox_condition %}
+      source._source_xmin <= target._target_xmax
+      AND source._source_xmax >= target._target_xmin
+      AND source._source_ymin <= target._target_ymax
+      AND source._source_ymax >= target._target_ymin
+  {% endset %}
+
+  WITH
+  {%- if source_key %}
+  _source_rows AS (
+    SELECT
+      {{ source_key }} AS s_rowid,
+      *
+    FROM {{ source_relation }}
+  ),
+  {%- endif %}
+  {%- if target_key %}
+  _target_rows AS (
+    SELECT
+      {{ target_key }} AS t_rowid,
+      *
+    FROM {{ target_relation }}
+  ),
+  {%- endif %}
+
+  {#
+    Only row ids (or the carried output columns), parsed geometries and their
+    boxes go through the spatial join; each geometry is parsed once per row.
+    Points written by CreatePoint as WKB, struct or H3 cell skip WKT parsing, and
+    the H3 cover reads each format as it is, never rendering WKT.
+  #}
+  _source AS (
+    SELECT
+      *,
+      ST_XMin(_source_geom) AS _source_xmin,
+      ST_XMax(_source_geom) AS _source_xmax,
+      ST_YMin(_source_geom) AS _source_ymin,
+      ST_YMax(_source_geom) AS _source_ymax
+      {%- if use_h3 %},
+      {{ _SpatialMatch_h3_cover(sourceFormat, '_source_raw', '_source_geom', h3Resolution, type == 'envelope') }} AS _source_cells
+      {%- endif %}
+    FROM (
+      SELECT
+        {%- for col in source_carry %}
+        {{ col }},
+        {%- endfor %}
+        {%- if use_h3 and sourceFormat != 'struct' %}
+        {{ source_col }} AS _source_raw,
+        {%- endif %}
+        {{ _geo_geometry(sourceFormat, source_col) }} AS _source_geom
+      FROM {{ '_source_rows' if source_key else source_relation }}
+    )
+  ),
+  _target AS (
+    SELECT
+      *,
+      ST_XMin(_target_geom) AS _target_xmin,
+      ST_XMax(_target_geom) AS _target_xmax,
+      ST_YMin(_target_geom) AS _target_ymin,
+      ST_YMax(_target_geom) AS _target_ymax
+      {%- if use_h3 %},
+      {{ _SpatialMatch_h3_cover(targetFormat, '_target_raw', '_target_geom', h3Resolution, type == 'envelope') }} AS _target_cells
+      {%- endif %}
+    FROM (
+      SELECT
+        {%- if target_key %}
+        t_rowid,
+        {%- else %}
+        {%- for col in target_columns %}
+        {{ col }} AS target_{{ col }},
+        {%- endfor %}
+        {%- endif %}
+        {%- if use_h3 and targetFormat != 'struct' %}
+        {{ target_col }} AS _target_raw,
+        {%- endif %}
+        {%- if matchCardinality == 'first' and priorityColumn %}
+        {{ priorityColumn }} AS _target_priority,
+        {%- endif %}
+        {{ _geo_geometry(targetFormat, target_col) }} AS _target_geom
+      FROM {{ '_target_rows' if target_key else target_relation }}
+    )
+  ),
+
+  {% if use_h3 %}
+
+  {#
+    Every supported match type needs the two geometries (or their envelopes) to
+    share at least one point, so both sides must share at least one covering H3
+    cell. The cell equi-join only produces candidates; the exact predicate still
+    decides, once per distinct pair: with both keys the candidate ids are made
+    distinct before the geometries are joined back, otherwise each pair is only
+    kept at the smallest cell both sides share.
+  #}
+  {% set pairs_by_id = source_key and target_key and not semi_join %}
+  _source_cells AS (
+    SELECT {{ 's_rowid' if semi_join or pairs_by_id else '*' }}, EXPLODE(_source_cells) AS h3_cell
+    FROM _source
+  ),
+  _target_cells AS (
+    SELECT {{ 't_rowid' if pairs_by_id else '*' }}, EXPLODE(_target_cells) AS h3_cell
+    FROM _target
+  ),
+
+  {% if semi_join %}
+  _matches AS (
+    SELECT
+      source.s_rowid
+    FROM _source AS source
+    LEFT SEMI JOIN (
+      SELECT
+        c.s_rowid AS _candidate_s_rowid,
+        target.*
+      FROM _source_cells AS c
+      JOIN _target_cells AS target
+        ON c.h3_cell = target.h3_cell
+    ) AS target
+      ON source.s_rowid = target._candidate_s_rowid
+      AND {{ bbox_condition }}
+      AND ({{ match_condition }})
+  ){% if aggregate %},{% endif %}
+  {% elif pairs_by_id %}
+  _candidates AS (
+    SELECT DISTINCT
+      s.s_rowid,
+      t.t_rowid
+    FROM _source_cells AS s
+    JOIN _target_cells AS t
+      ON s.h3_cell = t.h3_cell
+  ),
+  _matches AS (
+    SELECT
+      {{ match_select | join(',\n      ') }}
+    FROM _candidates AS c
+    JOIN _source AS source
+      ON c.s_rowid = source.s_rowid
+    JOIN _target AS target
+      ON c.t_rowid = target.t_rowid
+    WHERE
+      {{ bbox_condition }}
+      AND ({{ match_condition }})
+  ){% if aggregate %},{% endif %}
+  {% else %}
+  _matches AS (
+    SELECT
+      {{ match_select | join(',\n      ') }}
+    FROM _source_cells AS source
+    JOIN _target_cells AS target
+      ON source.h3_cell = target.h3_cell
+    WHERE
+      source.h3_cell = ARRAY_MIN(ARRAY_INTERSECT(source._source_cells, target._target_cells))
+      AND {{ bbox_condition }}
+      AND ({{ match_condition }})
+  ){% if aggregate %},{% endif %}
+  {% endif %}
+
+  {% else %}
+
+  {% if semi_join %}
+  _matches AS (
+    SELECT
+      source.s_rowid
+    FROM _source AS source
+    LEFT SEMI JOIN _target AS target
+      ON {% if has_predicate %}{{ bbox_condition }}
+      AND {% endif %}({{ match_condition }})
+  ){% if aggregate %},{% endif %}
+  {% else %}
+  _matches AS (
+    SELECT {% if rangeJoinBinSize > 0 %}/*+ RANGE_JOIN(target, {{ rangeJoinBinSize }}) */{% endif %}
+      {{ match_select | join(',\n      ') }}
+    FROM _source AS source
+    {% if has_predicate %}
+    JOIN _target AS target
+      ON {{ bbox_condition }}
+    {% else %}
+    CROSS JOIN _target AS target
+    {% endif %}
+    WHERE
+      {{ match_condition }}
+  ){% if aggregate %},{% endif %}
+  {% endif %}
+
+  {% endif %}
+
+  {#
+    One row per source row: the aggregates run right after the join (partial
+    aggregation happens before any shuffle), so matching pairs never get
+    materialized or re-joined. Empty priorities come last and ties on priority
+    go to the lowest target row id, in both directions. A descending priority
+    cannot be flipped into one MIN_BY ordering for every column type, so it
+    keeps the pairs holding the highest priority per source (MAX ignores
+    nulls) and takes the lowest target row id among them.
+  #}
+  {% if matchCardinality == 'first' and priorityColumn and priorityDescending %}
+  _result AS (
+    SELECT
+      s_rowid,
+      MIN(t_rowid) AS t_rowid
+    FROM (
+      SELECT
+        s_rowid,
+        t_rowid,
+        _target_priority,
+        MAX(_target_priority) OVER (PARTITION BY s_rowid) AS _best_priority
+      FROM _matches
+    )
+    WHERE _target_priority <=> _best_priority
+    GROUP BY s_rowid
+  )
+  {% elif matchCardinality == 'first' %}
+  _result AS (
+    SELECT
+      s_rowid,
+      {% if priorityColumn %}
+      MIN_BY(
+        t_rowid,
+        STRUCT(_target_priority IS NULL, _target_priority, t_rowid)
+      ) AS t_rowid
+      {% else %}
+      MIN(t_rowid) AS t_rowid
+      {% endif %}
+    FROM _matches
+    GROUP BY s_rowid
+  )
+  {% elif matchCardinality == 'count' %}
+  _result AS (
+    -- every source row, 0 for the ones nothing matched
+    SELECT
+      source.s_rowid,
+      COALESCE(c.match_count, 0) AS match_count
+    FROM _source AS source
+    LEFT JOIN (
+      SELECT
+        s_rowid,
+        COUNT(*) AS match_count
+      FROM _matches
+      GROUP BY s_rowid
+    ) AS c
+      ON source.s_rowid = c.s_rowid
+  )
+  {% endif %}
+
+  SELECT
+    {{ (source_select + target_select + (['m.match_count'] if matchCardinality == 'count' else [])) | join(',\n    ') }}
+  FROM {{ '_result' if aggregate else '_matches' }} AS m
+  {% if source_rejoin %}
+  JOIN _source_rows AS source
+    ON m.s_rowid = source.s_rowid
+  {% endif %}
+  {% if target_rejoin %}
+  JOIN _target_rows AS target
+    ON m.t_rowid = target.t_rowid
+  {% endif %}
+
+{%- endmacro %}
+
 
+{#
+  H3 cells covering a geometry column in the given format: points map to their
+  single cell (from the parsed point's coordinates), lines and polygons to the
+  cells that minimally cover their WKT or WKB as is (optionally their envelope,
+  taken from the already parsed geometry). An H3 cell id already at the
+  resolution is its own cover; at any other resolution its centre is used.
+#}
+{% macro _SpatialMatch_h3_cover(geometry_format, raw_col, geom_col, resolution, use_envelope=false) -%}
+  {%- set point_cell = 'H3_LONGLATASH3(ST_X(' ~ geom_col ~ '), ST_Y(' ~ geom_col ~ '), ' ~ resolution ~ ')' -%}
+  {%- if geometry_format == 'struct' -%}
+  ARRAY({{ point_cell }})
+  {%- elif geometry_format == 'h3' -%}
+  ARRAY(IF(H3_RESOLUTION({{ raw_col }}) = {{ resolution }}, {{ raw_col }}, {{ point_cell }}))
+  {%- else -%}
+  CASE
+    {%- if geometry_format == 'wkb' %}
+    WHEN ST_GeometryType({{ geom_col }}) = 'ST_Point'
+    {%- else %}
+    WHEN UPPER(LTRIM({{ raw_col }})) LIKE 'POINT%'
+    {%- endif %}
+      THEN ARRAY({{ point_cell }})
+    {%- if use_envelope %}
+    ELSE H3_COVERASH3(ST_AsWKB(ST_Envelope({{ geom_col }})), {{ resolution }})
+    {%- else %}
+    ELSE H3_COVERASH3({{ raw_col }}, {{ resolution }})
+    {%- endif %}
+  END
+  {%- endif -%}
 {%- endmacro %}
@@ -0,0 +1,62 @@
+{#
+  FindNearest with searchMethod 'h3index' and no maxDistance (expanding H3
+  rings) must return exactly the neighbours of the brute-force search. At
+  resolution 7 the pentagon sources (base cell 4, 64.7 N, 10.536 E) are settled
+  in the first rings, the antimeridian and ordinary sources in a wider one, and
+  the source in the empty South Pacific only by the cross-join fallback. No key
+  column, so the rows are told apart by their hashed ids. Returns the rows found
+  by only one of the two searches.
+#}
+WITH src AS (
+    SELECT * FROM VALUES
+        (1, 'POINT (10.53619907546767 64.70000012793489)'),
+        (2, 'POINT (10.40 64.75)'),
+        (3, 'POINT (10.70 64.62)'),
+        (4, 'POINT (179.98 -16.5)'),
+        (5, 'POINT (-74.0 40.0)'),
+        (6, 'POINT (-140.0 -45.0)')
+        AS t(sid, sgeom)
+),
+
+tgt AS (
+    SELECT * FROM VALUES
+        (11, 'POINT (10.5401 64.7123)'),
+        (12, 'POINT (10.4876 64.6811)'),
+        (13, 'POINT (10.6123 64.7345)'),
+        (14, 'POINT (10.3412 64.7702)'),
+        (15, 'POINT (10.7789 64.5987)'),
+        (16, 'POINT (10.9502 64.8123)'),
+        (21, 'POINT (-179.97 -16.52)'),
+        (22, 'POINT (179.90 -16.40)'),
+        (23, 'POINT (-179.85 -16.61)'),
+        (31, 'POINT (-73.95 40.05)'),
+        (32, 'POINT (-74.12 39.91)'),
+        (33, 'POINT (-73.80 40.20)')
+        AS t(tid, tgeom)
+),
+
+bruteforce AS (
+    {{ FindNearest(['src', 'tgt'], 'sgeom', 'tgeom', 'point', 'point', 2, 0, 'kms', false, ['sid', 'sgeom'], ['tid', 'tgeom'], 'bruteforce', 7, outputDirection=false, sortOutput=false) }}
+),
+
+h3index AS (
+    {{ FindNearest(['src', 'tgt'], 'sgeom', 'tgeom', 'point', 'point', 2, 0, 'kms', false, ['sid', 'sgeom'], ['tid', 'tgeom'], 'h3index', 7, outputDirection=false, sortOutput=false) }}
+),
+
+expected AS (
+    SELECT sid, tid, rank_number, ROUND(distanceKilometers, 6) AS distance FROM bruteforce
+),
+
+actual AS (
+    SELECT sid, tid, rank_number, ROUND(distanceKilometers, 6) AS distance FROM h3index
+)
+
+SELECT 'missing' AS problem, * FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+UNION ALL
+SELECT 'unexpected' AS problem, * FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)
+
+UNION ALL
+
+-- the South Pacific source must still get its two neighbours
+SELECT 'fallback' AS problem, 6 AS sid, NULL AS tid, NULL AS rank_number, NULL AS distance
+WHERE (SELECT COUNT(*) FROM h3index WHERE sid = 6) <> 2
@@ -0,0 +1,38 @@
+{#
+  _geo_distance_expr on known city pairs, in metres: vincenty stays within the
+  ratio _geo_formula_sphere_ratio allows for it against haversine (the cutoff
+  prefilters are sized on that ratio), equirectangular is never shorter than
+  haversine, and vincenty reproduces the Flinders Peak to Buninyong geodesic
+  (54972.271 m) to a millimetre. Returns the pairs that break a rule.
+#}
+{%- set radius = _geo_units('mtr').radius %}
+{%- set vincenty_ratio = _geo_formula_sphere_ratio('vincenty') %}
+
+WITH pairs AS (
+    SELECT * FROM VALUES
+        ('london_paris', 51.5074D, -0.1278D, 48.8566D, 2.3522D, CAST(NULL AS DOUBLE)),
+        ('helsinki_tallinn', 60.1699D, 24.9384D, 59.4370D, 24.7536D, NULL),
+        ('sydney_melbourne', -33.8688D, 151.2093D, -37.8136D, 144.9631D, NULL),
+        ('new_york_los_angeles', 40.7128D, -74.0060D, 34.0522D, -118.2437D, NULL),
+        ('reykjavik_cape_town', 64.1466D, -21.9426D, -33.9249D, 18.4241D, NULL),
+        ('fiji_samoa', -18.1248D, 178.4501D, -13.8333D, -171.7667D, NULL),
+        ('flinders_peak_buninyong', -37.95103341666667D, 144.42486788888888D, -37.65282113888889D, 143.92649552777777D, 54972.271D)
+        AS t(pair, lat1, lon1, lat2, lon2, geodesic)
+),
+
+distances AS (
+    SELECT
+        pair,
+        geodesic,
+        {{ _geo_distance_expr('haversine', radius) }} AS haversine,
+        {{ _geo_distance_expr('equirectangular', radius) }} AS equirectangular,
+        {{ _geo_distance_expr('vincenty', radius) }} AS vincenty
+    FROM pairs
+)
+
+SELECT *
+FROM distances
+WHERE vincenty / haversine < {{ vincenty_ratio }}
+    OR vincenty / haversine > 1 / {{ vincenty_ratio }}
+    OR equirectangular < haversine
+    OR ABS(vincenty - geodesic) > 0.001
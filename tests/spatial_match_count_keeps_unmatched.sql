@@ -0,0 +1,35 @@
+{#
+  SpatialMatch 'count' mode: every source row comes back, the ones no target
+  falls into with a count of 0. Returns the rows whose count is wrong or that
+  are missing.
+#}
+WITH src AS (
+    SELECT * FROM VALUES
+        (1, 'POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))', 2),
+        (2, 'POLYGON ((20 20, 30 20, 30 30, 20 30, 20 20))', 1),
+        (3, 'POLYGON ((40 40, 50 40, 50 50, 40 50, 40 40))', 0)
+        AS t(sid, geom, expected_count)
+),
+
+tgt AS (
+    SELECT * FROM VALUES
+        (10, 'POINT (1 1)'),
+        (20, 'POINT (5 5)'),
+        (30, 'POINT (25 25)'),
+        (40, 'POINT (60 60)')
+        AS t(tid, geom)
+),
+
+counts AS (
+    {{ SpatialMatch(['src', 'tgt'], [['sid', 'expected_count'], []], 'geom', 'geom', 'contains', 'crossjoin', 7, 0, ['sid', 'tid'], 'count') }}
+)
+
+SELECT sid, expected_count, match_count
+FROM counts
+WHERE match_count <> expected_count
+
+UNION ALL
+
+SELECT sid, expected_count, NULL AS match_count
+FROM src
+WHERE sid NOT IN (SELECT sid FROM counts)
@@ -0,0 +1,46 @@
+{#
+  SpatialMatch 'first' mode: the best priority wins, empty priorities come
+  last and ties go to the lowest target key, both ascending and descending.
+  Every target point lies inside the one source polygon. Returns the rows that
+  break the rule.
+#}
+WITH src AS (
+    SELECT * FROM VALUES
+        (1, 'POLYGON ((0 0, 10 0, 10 10, 0 10, 0 0))')
+        AS t(sid, geom)
+),
+
+tgt AS (
+    SELECT * FROM VALUES
+        (30, 'POINT (1 1)', 5),
+        (10, 'POINT (2 2)', 5),
+        (50, 'POINT (3 3)', 1),
+        (20, 'POINT (4 4)', 1),
+        (40, 'POINT (5 5)', CAST(NULL AS INT))
+        AS t(tid, geom, priority)
+),
+
+ascending AS (
+    {{ SpatialMatch(['src', 'tgt'], [['sid'], ['tid']], 'geom', 'geom', 'contains', 'crossjoin', 7, 0, ['sid', 'tid'], 'first', 'priority', false) }}
+),
+
+descending AS (
+    {{ SpatialMatch(['src', 'tgt'], [['sid'], ['tid']], 'geom', 'geom', 'contains', 'crossjoin', 7, 0, ['sid', 'tid'], 'first', 'priority', true) }}
+),
+
+results AS (
+    SELECT 'ascending' AS direction, sid, target_tid, 20 AS expected_tid FROM ascending
+    UNION ALL
+    SELECT 'descending' AS direction, sid, target_tid, 10 AS expected_tid FROM descending
+)
+
+SELECT *
+FROM results
+WHERE target_tid <> expected_tid
+
+UNION ALL
+
+-- exactly one match per source row and direction
+SELECT direction, NULL AS sid, NULL AS target_tid, NULL AS expected_tid
+FROM (SELECT 'ascending' AS direction UNION ALL SELECT 'descending') AS d
+WHERE (SELECT COUNT(*) FROM results AS r WHERE r.direction = d.direction) <> 1
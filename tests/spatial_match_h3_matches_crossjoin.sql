@@ -0,0 +1,54 @@
+{#
+  SpatialMatch with matchMethod 'h3index' must find exactly the pairs of the
+  cross join, with key columns (candidate ids made distinct) and without (each
+  pair kept at its smallest shared cell). Shapes sit on the H3 pentagon of base
+  cell 4 (64.7 N, 10.536 E), one point lies on a polygon edge, a line and a
+  large polygon span many cells. Returns the pairs found by only one method.
+#}
+WITH src AS (
+    SELECT * FROM VALUES
+        (1, 'POINT (10.53619907546767 64.70000012793489)'),
+        (2, 'POINT (10.40 64.75)'),
+        (3, 'POINT (10.95 64.70)'),
+        (4, 'LINESTRING (10.45 64.70, 10.60 64.70)'),
+        (5, 'POINT (-74.0 40.0)'),
+        (6, 'POINT (10.57 64.70)')
+        AS t(sid, geom)
+),
+
+tgt AS (
+    SELECT * FROM VALUES
+        (11, 'POLYGON ((10.50 64.69, 10.57 64.69, 10.57 64.71, 10.50 64.71, 10.50 64.69))'),
+        (12, 'POLYGON ((10.3 64.6, 10.9 64.6, 10.9 64.85, 10.3 64.85, 10.3 64.6))'),
+        (13, 'POLYGON ((-74.1 39.9, -73.9 39.9, -73.9 40.1, -74.1 40.1, -74.1 39.9))'),
+        (14, 'POLYGON ((11.5 65.5, 11.6 65.5, 11.6 65.6, 11.5 65.6, 11.5 65.5))')
+        AS t(tid, geom)
+),
+
+crossjoin AS (
+    {{ SpatialMatch(['src', 'tgt'], [['sid'], ['tid']], 'geom', 'geom', 'intersects', 'crossjoin', 7, 0, ['sid', 'tid']) }}
+),
+
+h3_keyed AS (
+    {{ SpatialMatch(['src', 'tgt'], [['sid'], ['tid']], 'geom', 'geom', 'intersects', 'h3index', 7, 0, ['sid', 'tid']) }}
+),
+
+h3_keyless AS (
+    {{ SpatialMatch(['src', 'tgt'], [['sid'], ['tid']], 'geom', 'geom', 'intersects', 'h3index', 7, 0, []) }}
+),
+
+results AS (
+    SELECT 'keyed' AS variant, sid, target_tid FROM h3_keyed
+    UNION ALL
+    SELECT 'keyless' AS variant, sid, target_tid FROM h3_keyless
+),
+
+expected AS (
+    SELECT v.variant, c.sid, c.target_tid
+    FROM crossjoin AS c
+    CROSS JOIN (SELECT 'keyed' AS variant UNION ALL SELECT 'keyless') AS v
+)
+
+SELECT 'missing' AS problem, * FROM (SELECT * FROM expected EXCEPT ALL SELECT * FROM results)
+UNION ALL
+SELECT 'unexpected' AS problem, * FROM (SELECT * FROM results EXCEPT ALL SELECT * FROM expected)